@@ -5,8 +5,12 @@ Based on the implementation from test_bidirectional.py
 """
 
 import asyncio
+import atexit
 import base64
-import numpy as np
+import gc
+import os
+import sys
+import threading
 import sounddevice as sd
 from typing import Optional, Callable
 
@@ -16,85 +20,345 @@ CHANNELS = 1
 DTYPE = "int16"
 CHUNK_MS = 20
 FRAMES_PER_CHUNK = int(SAMPLE_RATE * CHUNK_MS / 1000)
+BYTES_PER_CHUNK = FRAMES_PER_CHUNK * CHANNELS * 2  # int16 samples
+RING_CHUNKS = 50  # ~1s of audio buffered between PortAudio and Python
+# Process-wide gen0 GC threshold set once audio starts (default 700): fewer
+# young-gen collections while streaming. The older-generation multipliers
+# stay at the default 10 so cycles from long-lived work still get collected
+GC_GEN0_THRESHOLD = 100_000
+
+def _no_log(_message: str) -> None:
+    pass
+
+def _stream_options(kind: str) -> dict:
+    """PortAudio open options shared by the microphone and speaker streams.
+
+    Defaults ask for the device's low-latency buffering at one chunk per
+    callback; AUDIO_LATENCY_MS and AUDIO_BLOCKSIZE (frames) override them per
+    deployment. Read at open time so values from .env are already loaded.
+    """
+    latency_ms = os.getenv("AUDIO_LATENCY_MS")
+    options = {
+        "blocksize": int(os.getenv("AUDIO_BLOCKSIZE", FRAMES_PER_CHUNK)),
+        "latency": float(latency_ms) / 1000 if latency_ms else "low",
+    }
+    if sys.platform == "win32":
+        # Shared-mode WASAPI; the settings object is only valid for WASAPI
+        # devices, so leave MME/DirectSound defaults untouched
+        hostapi = sd.query_hostapis(sd.query_devices(kind=kind)["hostapi"])
+        if "WASAPI" in hostapi["name"]:
+            options["extra_settings"] = sd.WasapiSettings(exclusive=False)
+    return options
 
 class AudioService:
     """Audio service for microphone and speaker handling"""
     
-    def __init__(self):
+    def __init__(self, log: Optional[Callable[[str], None]] = None):
+        # Diagnostics go through an optional callback instead of print(), which
+        # takes the stdout lock and can block when stdout is a pipe
+        self._log = log or _no_log
         self.microphone: Optional[Microphone] = None
         self.speaker: Optional[Speaker] = None
         self.is_initialized = False
         
     def initialize(self):
-        """Initialize audio devices"""
+        """Initialize audio devices (once per process; later calls are no-ops)"""
+        # Opening PortAudio streams is slow and allocates device buffers, so the
+        # pair is shared by every connection and only closed at exit
+        if self.is_initialized:
+            return
         try:
-            self.microphone = Microphone()
-            self.speaker = Speaker()
+            self.microphone = Microphone(self._log)
+            self.speaker = Speaker(self._log)
             self.is_initialized = True
-            print("[AudioService] Audio devices initialized successfully")
+            self._freeze_startup_heap()
+            self._log("[AudioService] Audio devices initialized successfully")
         except Exception as e:
-            print(f"[AudioService] Failed to initialize audio devices: {e}")
+            self._log(f"[AudioService] Failed to initialize audio devices: {e}")
             self.is_initialized = False
     
+    @staticmethod
+    def _freeze_startup_heap():
+        """Move everything allocated so far into the GC's permanent generation.
+
+        Imports and singletons (LangGraph, OpenAI, websockets, the streams
+        above) are never freed, so excluding them keeps collections during
+        streaming short. Objects created afterwards (handlers, messages) still
+        live in the young generations and are collected normally; the raised
+        gen0 threshold just makes those collections rarer.
+
+        Note that GC thresholds are process-wide: this changes collection
+        frequency for the whole server, not only the audio path, so only the
+        gen0 threshold is raised and gen1/gen2 keep their default multipliers.
+        """
+        gc.collect()
+        gc.freeze()
+        _, gen1, gen2 = gc.get_threshold()
+        gc.set_threshold(GC_GEN0_THRESHOLD, gen1, gen2)
+
+    def reset(self):
+        """Drop buffered audio between connections without closing the streams"""
+        if self.microphone:
+            self.microphone.flush()
+        if self.speaker:
+            self.speaker.flush()
+
     def cleanup(self):
-        """Clean up audio devices"""
+        """Clean up audio devices (registered with atexit)"""
+        if not self.is_initialized and not self.microphone and not self.speaker:
+            return  # never opened (e.g. only RingBuffer was imported)
         if self.microphone:
             self.microphone.close()
+            self.microphone = None
         if self.speaker:
             self.speaker.close()
+            self.speaker = None
         self.is_initialized = False
-        print("[AudioService] Audio devices cleaned up")
+        self._log("[AudioService] Audio devices cleaned up")
+
+class RingBuffer:
+    """Single-producer/single-consumer byte ring shared with a PortAudio callback.
+
+    The producer only ever advances ``_head`` and the consumer only ever
+    advances ``_tail`` (both are running byte counts), so the two sides never
+    need a lock: each index has exactly one writer.
+    """
+
+    def __init__(self, capacity: int):
+        self._capacity = capacity
+        self._buf = bytearray(capacity)
+        self._view = memoryview(self._buf)
+        self._head = 0  # total bytes written
+        self._tail = 0  # total bytes read
+
+    def __len__(self) -> int:
+        """Bytes available to read"""
+        return self._head - self._tail
+
+    def free(self) -> int:
+        """Bytes available to write"""
+        return self._capacity - (self._head - self._tail)
+
+    def write(self, data) -> int:
+        """Copy as much of ``data`` as fits; returns the number of bytes written"""
+        src = memoryview(data).cast("B")
+        n = min(len(src), self.free())
+        if n:
+            start = self._head % self._capacity
+            first = min(n, self._capacity - start)
+            self._view[start:start + first] = src[:first]
+            if n > first:
+                self._view[:n - first] = src[first:n]
+            self._head += n
+        return n
+
+    def read_into(self, out) -> int:
+        """Fill ``out`` from the ring; returns the number of bytes copied"""
+        dst = memoryview(out).cast("B")
+        n = min(len(dst), len(self))
+        if n:
+            start = self._tail % self._capacity
+            first = min(n, self._capacity - start)
+            dst[:first] = self._view[start:start + first]
+            if n > first:
+                dst[first:n] = self._view[:n - first]
+            self._tail += n
+        return n
+
+    def clear(self):
+        """Discard everything buffered (consumer side only)"""
+        self._tail = self._head
+
+    def pop(self, n: int) -> bytes:
+        """Remove and return exactly ``n`` bytes (caller checks ``len`` first)"""
+        start = self._tail % self._capacity
+        end = start + n
+        if end <= self._capacity:
+            data = bytes(self._view[start:end])
+        else:
+            data = bytes(self._view[start:]) + bytes(self._view[:end - self._capacity])
+        self._tail += n
+        return data
 
 class Microphone:
     """Microphone input handler"""
+
+    __slots__ = ("_log", "_ring", "_ready", "stream")
     
-    def __init__(self):
-        self.stream = sd.InputStream(
+    def __init__(self, log: Callable[[str], None] = _no_log):
+        self._log = log
+        self._ring = RingBuffer(RING_CHUNKS * BYTES_PER_CHUNK)
+        self._ready = threading.Event()
+        # Callback stream: PortAudio pushes captured blocks into the ring from
+        # its own thread, so capture keeps running while Python is busy
+        self.stream = sd.RawInputStream(
             samplerate=SAMPLE_RATE,
             channels=CHANNELS,
             dtype=DTYPE,
-            blocksize=FRAMES_PER_CHUNK,
+            **_stream_options("input"),
+            callback=self._make_in_cb(),
         )
         self.stream.start()
-        print("[Microphone] Initialized")
+        self._log("[Microphone] Initialized")
+
+    def _make_in_cb(self):
+        """Build the PortAudio input callback with its collaborators pre-bound.
+
+        The callback appends each block to the ring (dropping it if the ring is
+        full); binding the methods up front skips the attribute lookups on
+        every block.
+        """
+        write = self._ring.write
+        ready = self._ready.set
+
+        def _in_cb(indata, frames, time_info, status):
+            write(indata)
+            ready()
+
+        return _in_cb
 
     def read_chunk(self) -> bytes:
         """Read a chunk of audio data from microphone"""
-        frames, _ = self.stream.read(FRAMES_PER_CHUNK)
-        return frames.tobytes()
+        # Hot path (every CHUNK_MS): never log from here or from the callback
+        ring = self._ring
+        if len(ring) < BYTES_PER_CHUNK:
+            self._wait_for_chunk()
+        return ring.pop(BYTES_PER_CHUNK)
+
+    def read_chunk_into(self, out: bytearray) -> int:
+        """Like read_chunk, but copy the chunk into a reusable ``out`` buffer
+        (BYTES_PER_CHUNK long) instead of allocating; returns the byte count"""
+        if len(self._ring) < BYTES_PER_CHUNK:
+            self._wait_for_chunk()
+        return self._ring.read_into(out)
+
+    def has_chunk(self) -> bool:
+        """Whether a full chunk is buffered, i.e. a read would not block"""
+        return len(self._ring) >= BYTES_PER_CHUNK
+
+    def _wait_for_chunk(self):
+        """Block until a full chunk is buffered"""
+        ring = self._ring
+        while len(ring) < BYTES_PER_CHUNK:
+            self._ready.clear()
+            if len(ring) >= BYTES_PER_CHUNK:
+                break
+            if self.stream.closed:
+                raise RuntimeError("Microphone stream is closed")
+            self._ready.wait(CHUNK_MS / 1000)
+
+    def flush(self):
+        """Discard captured audio that has not been read yet"""
+        self._ring.clear()
 
     def close(self):
         """Close microphone stream"""
         self.stream.stop()
         self.stream.close()
-        print("[Microphone] Closed")
+        self._log("[Microphone] Closed")
+
+    def __del__(self):
+        # AudioService.cleanup() closes the stream at exit from the main thread;
+        # this only catches instances dropped while still running
+        stream = getattr(self, "stream", None)
+        if stream is not None and stream.active:
+            self.close()
 
 class Speaker:
     """Speaker output handler"""
+
+    __slots__ = ("_log", "_ring", "_space", "_flush", "_silence", "stream")
     
-    def __init__(self):
-        self.stream = sd.OutputStream(
+    def __init__(self, log: Callable[[str], None] = _no_log):
+        self._log = log
+        self._ring = RingBuffer(RING_CHUNKS * BYTES_PER_CHUNK)
+        self._space = threading.Event()
+        self._flush = threading.Event()
+        self._silence = memoryview(bytes(BYTES_PER_CHUNK))
+        # Callback stream: PortAudio pulls from the ring and plays silence on
+        # underrun instead of stalling
+        self.stream = sd.RawOutputStream(
             samplerate=SAMPLE_RATE,
             channels=CHANNELS,
             dtype=DTYPE,
-            blocksize=FRAMES_PER_CHUNK,
+            **_stream_options("output"),
+            callback=self._make_out_cb(),
         )
         self.stream.start()
-        print("[Speaker] Initialized")
+        self._log("[Speaker] Initialized")
+
+    def _make_out_cb(self):
+        """Build the PortAudio output callback with its collaborators pre-bound.
+
+        The callback drains the ring into the device buffer and zero-fills any
+        remainder; binding the methods up front skips the attribute lookups on
+        every block.
+        """
+        read_into = self._ring.read_into
+        clear = self._ring.clear
+        space = self._space.set
+        flush_requested = self._flush.is_set
+        flush_done = self._flush.clear
+        silence = self._silence
+        silence_len = len(silence)
+
+        def _out_cb(outdata, frames, time_info, status):
+            if flush_requested():
+                # The callback is the ring's consumer, so it does the clearing
+                clear()
+                flush_done()
+            view = memoryview(outdata).cast("B")
+            n = read_into(view)
+            if n < len(view):
+                gap = len(view) - n
+                # Underrun: zero-fill from the preallocated block, no allocation
+                # on the audio thread unless PortAudio asks for an oversized block
+                view[n:] = silence[:gap] if gap <= silence_len else bytes(gap)
+            space()
+
+        return _out_cb
 
     def play_bytes(self, pcm_bytes: bytes):
-        """Play PCM audio bytes through speaker"""
-        # bytes(int16 little-endian) -> numpy -> write
-        audio = np.frombuffer(pcm_bytes, dtype=np.int16)
-        # Reshape for mono/stereo as needed
-        audio = audio.reshape(-1, CHANNELS) if CHANNELS > 1 else audio
-        self.stream.write(audio)
+        """Play PCM audio bytes (or any int16 buffer) through speaker.
+
+        Blocks only while the ring is full, which paces the producer at the
+        device rate the same way a blocking stream write did.
+        """
+        # Hot path (every audio delta): never log from here or from the callback
+        write = self._ring.write
+        pending = memoryview(pcm_bytes).cast("B")
+        while pending:
+            pending = pending[write(pending):]
+            if pending:
+                self._space.clear()
+                if not self._ring.free():
+                    self._space.wait(CHUNK_MS / 1000)
+
+    def play_array(self, arr):
+        """Play a C-contiguous int16 sample array (ndarray, array.array, ...).
+
+        The array is consumed through the buffer protocol, so callers that
+        already hold samples skip a bytes round-trip and this module does not
+        need numpy.
+        """
+        self.play_bytes(arr)
+
+    def flush(self):
+        """Drop queued playback; the callback clears the ring on its next block"""
+        self._flush.set()
 
     def close(self):
         """Close speaker stream"""
         self.stream.stop()
         self.stream.close()
-        print("[Speaker] Closed")
+        self._log("[Speaker] Closed")
+
+    def __del__(self):
+        # See Microphone.__del__
+        stream = getattr(self, "stream", None)
+        if stream is not None and stream.active:
+            self.close()
 
-# Global audio service instance
-audio_service = AudioService()
+# Global audio service instance (setup/teardown messages only, never per chunk)
+audio_service = AudioService(log=print)
+atexit.register(audio_service.cleanup)
@@ -5,46 +5,50 @@ Simple test script to verify the API works correctly.
 
 import asyncio
 import websockets
-import json
 import time
 
+from ws_test_utils import loads, dumps, WS_CONNECT_OPTIONS, IdleTimeout
+
+# Payloads are constant, so serialize them once at import
+TEST_MESSAGE = dumps({
+    "type": "user_message",
+    "content": "Hello, can you help me test the system?"
+})
+
 async def test_websocket():
     """Test WebSocket connection and message handling"""
     uri = "ws://localhost:8000/ws"
     
     try:
-        async with websockets.connect(uri) as websocket:
+        async with websockets.connect(uri, **WS_CONNECT_OPTIONS) as websocket:
             print("✅ Connected to WebSocket")
             
             # Wait for initial agent update
             response = await websocket.recv()
-            data = json.loads(response)
+            data = loads(response)
             print(f"📡 Received initial update: {data['type']}")
             
             # Send a test message
-            test_message = {
-                "type": "user_message",
-                "content": "Hello, can you help me test the system?"
-            }
-            
-            await websocket.send(json.dumps(test_message))
+            await websocket.send(TEST_MESSAGE)
             print("📤 Sent test message")
             
             # Wait for responses
-            for i in range(3):  # Expect user message, AI response, and agent update
-                try:
-                    response = await asyncio.wait_for(websocket.recv(), timeout=5.0)
-                    data = json.loads(response)
-                    print(f"📥 Received: {data['type']}")
-                    
-                    if data['type'] == 'new_message':
-                        print(f"   Message: {data['message']['content']}")
-                    elif data['type'] == 'agent_update':
-                        print(f"   Agent status: {data['agent_in_loop']['status']}")
+            # Ends after 5 s without a message (one timer, reset per message)
+            try:
+                async with IdleTimeout(5.0) as idle:
+                    for i in range(3):  # Expect user message, AI response, and agent update
+                        response = await websocket.recv()
+                        idle.reset()
+                        data = loads(response)
+                        print(f"📥 Received: {data['type']}")
                         
-                except asyncio.TimeoutError:
-                    print("⏰ Timeout waiting for response")
-                    break
+                        if data['type'] == 'new_message':
+                            print(f"   Message: {data['message']['content']}")
+                        elif data['type'] == 'agent_update':
+                            print(f"   Agent status: {data['agent_in_loop']['status']}")
+                            
+            except asyncio.TimeoutError:
+                print("⏰ Timeout waiting for response")
             
             print("✅ Test completed successfully")
             
@@ -5,54 +5,58 @@ Test script to verify that duplicate messages are fixed.
 
 import asyncio
 import websockets
-import json
 import time
 
+from ws_test_utils import loads, dumps, WS_CONNECT_OPTIONS, IdleTimeout
+
+# Payloads are constant, so serialize them once at import
+TEST_MESSAGE = dumps({
+    "type": "user_message",
+    "content": "Hello, can you help me test the system?"
+})
+
 async def test_duplicate_fix():
     """Test that messages are not duplicated"""
     uri = "ws://localhost:8000/ws"
     
     try:
-        async with websockets.connect(uri) as websocket:
+        async with websockets.connect(uri, **WS_CONNECT_OPTIONS) as websocket:
             print("✅ Connected to WebSocket")
             
             # Wait for initial agent update
             response = await websocket.recv()
-            data = json.loads(response)
+            data = loads(response)
             print(f"📡 Received initial update: {data['type']}")
             
             # Send a test message
-            test_message = {
-                "type": "user_message",
-                "content": "Hello, can you help me test the system?"
-            }
-            
-            await websocket.send(json.dumps(test_message))
+            await websocket.send(TEST_MESSAGE)
             print("📤 Sent test message")
             
             # Wait for responses and track message IDs
             message_ids = set()
             duplicate_count = 0
             
-            for i in range(10):  # Wait for up to 10 messages
-                try:
-                    response = await asyncio.wait_for(websocket.recv(), timeout=5.0)
-                    data = json.loads(response)
-                    
-                    if data['type'] == 'new_message':
-                        message_id = data['message']['id']
-                        if message_id in message_ids:
-                            duplicate_count += 1
-                            print(f"⚠️  Duplicate message detected: {message_id}")
-                        else:
-                            message_ids.add(message_id)
-                            print(f"📥 New message: {message_id} - {data['message']['content'][:50]}...")
-                    else:
-                        print(f"📥 Other message: {data['type']}")
+            # Ends after 5 s without a message (one timer, reset per message)
+            try:
+                async with IdleTimeout(5.0) as idle:
+                    for i in range(10):  # Wait for up to 10 messages
+                        response = await websocket.recv()
+                        idle.reset()
+                        data = loads(response)
                         
-                except asyncio.TimeoutError:
-                    print("⏰ Timeout waiting for response")
-                    break
+                        if data['type'] == 'new_message':
+                            message_id = data['message']['id']
+                            if message_id in message_ids:
+                                duplicate_count += 1
+                                print(f"⚠️  Duplicate message detected: {message_id}")
+                            else:
+                                message_ids.add(message_id)
+                                print(f"📥 New message: {message_id} - {data['message']['content'][:50]}...")
+                        else:
+                            print(f"📥 Other message: {data['type']}")
+                            
+            except asyncio.TimeoutError:
+                print("⏰ Timeout waiting for response")
             
             print(f"✅ Test completed.")
             print(f"📊 Total unique messages: {len(message_ids)}")
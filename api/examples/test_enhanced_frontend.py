@@ -6,29 +6,31 @@ This script simulates the background agent workflow and sends appropriate WebSoc
 
 import asyncio
 import websockets
-import json
 import time
 
+from ws_test_utils import loads, dumps, WS_CONNECT_OPTIONS, IdleTimeout
+
+# Payloads are constant, so serialize them once at import
+TEST_MESSAGE = dumps({
+    "type": "user_message",
+    "content": "Hello! Can you help me analyze this conversation and provide some insights?"
+})
+
 async def test_enhanced_frontend():
     """Test the enhanced frontend with background agent simulation"""
     uri = "ws://localhost:8000/ws"
     
     try:
-        async with websockets.connect(uri) as websocket:
+        async with websockets.connect(uri, **WS_CONNECT_OPTIONS) as websocket:
             print("✅ Connected to WebSocket")
             
             # Wait for initial agent update
             response = await websocket.recv()
-            data = json.loads(response)
+            data = loads(response)
             print(f"📡 Received initial update: {data['type']}")
             
             # Send a test message that should trigger background agent
-            test_message = {
-                "type": "user_message",
-                "content": "Hello! Can you help me analyze this conversation and provide some insights?"
-            }
-            
-            await websocket.send(json.dumps(test_message))
+            await websocket.send(TEST_MESSAGE)
             print("📤 Sent test message to trigger background agent")
             
             # Monitor responses and track agent activity
@@ -38,43 +40,42 @@ async def test_enhanced_frontend():
             
             print("\n🔍 Monitoring agent activity...")
             
-            for i in range(15):  # Wait for up to 15 messages
-                try:
-                    response = await asyncio.wait_for(websocket.recv(), timeout=10.0)
-                    data = json.loads(response)
-                    message_count += 1
-                    
-                    print(f"\n📥 Message {message_count}: {data['type']}")
-                    
-                    if data['type'] == 'new_message':
-                        content = data['message']['content']
-                        is_agent_result = data['message'].get('is_agent_result', False)
-                        
-                        if is_agent_result:
-                            agent_result_received = True
-                            print(f"   🎉 Agent Result: {content[:100]}...")
-                        else:
-                            print(f"   💬 Message: {content[:50]}...")
-                    
-                    elif data['type'] == 'agent_update':
-                        agent_updates_received += 1
-                        agent_in_loop = data.get('agent_in_loop', {})
-                        sub_agents = data.get('sub_agents', [])
-                        
-                        print(f"   🤖 Agent in Loop: {agent_in_loop.get('status', 'unknown')}")
-                        if agent_in_loop.get('current_task'):
-                            print(f"   📋 Current Task: {agent_in_loop['current_task']}")
+            # Ends after 10 s without a message (one timer, reset per message)
+            try:
+                async with IdleTimeout(10.0) as idle:
+                    for i in range(15):  # Wait for up to 15 messages
+                        response = await websocket.recv()
+                        idle.reset()
+                        data = loads(response)
+                        message_count += 1
                         
-                        active_sub_agents = [agent for agent in sub_agents if agent.get('status') == 'active']
-                        if active_sub_agents:
-                            print(f"   ⚡ Active Sub-agents: {[agent['name'] for agent in active_sub_agents]}")
+                        print(f"\n📥 Message {message_count}: {data['type']}")
                         
-                    elif data['type'] == 'keepalive':
-                        print("   💓 Keepalive received")
+                        if data['type'] == 'new_message':
+                            content = data['message']['content']
+                            is_agent_result = data['message'].get('is_agent_result', False)
+                            
+                            if is_agent_result:
+                                agent_result_received = True
+                                print(f"   🎉 Agent Result: {content[:100]}...")
+                            else:
+                                print(f"   💬 Message: {content[:50]}...")
                         
-                except asyncio.TimeoutError:
-                    print("⏰ Timeout waiting for response")
-                    break
+                        elif data['type'] == 'agent_update':
+                            agent_updates_received += 1
+                            agent_in_loop = data.get('agent_in_loop', {})
+                            sub_agents = data.get('sub_agents', [])
+                            
+                            print(f"   🤖 Agent in Loop: {agent_in_loop.get('status', 'unknown')}")
+                            if agent_in_loop.get('current_task'):
+                                print(f"   📋 Current Task: {agent_in_loop['current_task']}")
+                            
+                            active_sub_agents = [agent for agent in sub_agents if agent.get('status') == 'active']
+                            if active_sub_agents:
+                                print(f"   ⚡ Active Sub-agents: {[agent['name'] for agent in active_sub_agents]}")
+                            
+            except asyncio.TimeoutError:
+                print("⏰ Timeout waiting for response")
             
             print(f"\n📊 Test Results:")
             print(f"   Total messages received: {message_count}")
@@ -5,57 +5,61 @@ Test script to verify the API integration with background agents works correctly
 
 import asyncio
 import websockets
-import json
 import time
 
+from ws_test_utils import loads, dumps, WS_CONNECT_OPTIONS, IdleTimeout
+
+# Payloads are constant, so serialize them once at import
+TEST_MESSAGE = dumps({
+    "type": "user_message",
+    "content": "Hello! Can you help me understand how the background agents work?"
+})
+
 async def test_integration():
     """Test the complete integration"""
     uri = "ws://localhost:8000/ws"
     
     try:
-        async with websockets.connect(uri) as websocket:
+        async with websockets.connect(uri, **WS_CONNECT_OPTIONS) as websocket:
             print("✅ Connected to WebSocket")
             
             # Wait for initial agent update
             response = await websocket.recv()
-            data = json.loads(response)
+            data = loads(response)
             print(f"📡 Received initial update: {data['type']}")
             
             # Send a test message
-            test_message = {
-                "type": "user_message",
-                "content": "Hello! Can you help me understand how the background agents work?"
-            }
-            
-            await websocket.send(json.dumps(test_message))
+            await websocket.send(TEST_MESSAGE)
             print("📤 Sent test message")
             
             # Wait for responses
             message_count = 0
             agent_result_received = False
             
-            for i in range(10):  # Wait for up to 10 messages
-                try:
-                    response = await asyncio.wait_for(websocket.recv(), timeout=15.0)
-                    data = json.loads(response)
-                    message_count += 1
-                    print(f"📥 Message {message_count}: {data['type']}")
-                    
-                    if data['type'] == 'new_message':
-                        content = data['message']['content']
-                        print(f"   Content: {content[:100]}...")
+            # Ends after 15 s without a message (one timer, reset per message)
+            try:
+                async with IdleTimeout(15.0) as idle:
+                    for i in range(10):  # Wait for up to 10 messages
+                        response = await websocket.recv()
+                        idle.reset()
+                        data = loads(response)
+                        message_count += 1
+                        print(f"📥 Message {message_count}: {data['type']}")
                         
-                        if data['message']['is_agent_result']:
-                            agent_result_received = True
-                            print("   ✅ Agent result received!")
-                    
-                    elif data['type'] == 'agent_update':
-                        agent_status = data['agent_in_loop']['status']
-                        print(f"   Agent status: {agent_status}")
+                        if data['type'] == 'new_message':
+                            content = data['message']['content']
+                            print(f"   Content: {content[:100]}...")
+                            
+                            if data['message']['is_agent_result']:
+                                agent_result_received = True
+                                print("   ✅ Agent result received!")
                         
-                except asyncio.TimeoutError:
-                    print("⏰ Timeout waiting for response")
-                    break
+                        elif data['type'] == 'agent_update':
+                            agent_status = data['agent_in_loop']['status']
+                            print(f"   Agent status: {agent_status}")
+                            
+            except asyncio.TimeoutError:
+                print("⏰ Timeout waiting for response")
             
             print(f"✅ Test completed. Received {message_count} messages")
             
@@ -5,9 +5,20 @@ Test script to verify that speech mode switching works correctly.
 
 import asyncio
 import websockets
-import json
 import time
 
+from ws_test_utils import loads, dumps, WS_CONNECT_OPTIONS, IdleTimeout
+
+# Payloads are constant, so serialize them once at import
+TEXT_TEST_MESSAGE = dumps({
+    "type": "user_message",
+    "content": "Hello, this is a test message in text mode"
+})
+SPEECH_TEST_MESSAGE = dumps({
+    "type": "test",
+    "message": "Testing speech mode connection"
+})
+
 async def test_speech_mode_switching():
     """Test that speech mode switching works correctly"""
     print("🧪 Testing Speech Mode Switching...")
@@ -22,31 +33,29 @@ async def test_speech_mode_switching():
     text_uri = "ws://localhost:8000/ws"
     
     try:
-        async with websockets.connect(text_uri) as websocket:
+        async with websockets.connect(text_uri, **WS_CONNECT_OPTIONS) as websocket:
             print("✅ Connected to Text Mode WebSocket")
             
             # Wait for initial agent update
             response = await websocket.recv()
-            data = json.loads(response)
+            data = loads(response)
             print(f"📡 Received initial update: {data['type']}")
             
             # Send a test message
-            test_message = {
-                "type": "user_message",
-                "content": "Hello, this is a test message in text mode"
-            }
-            
-            await websocket.send(json.dumps(test_message))
+            await websocket.send(TEXT_TEST_MESSAGE)
             print("📤 Sent test message in text mode")
             
             # Wait for response
-            for i in range(3):
-                try:
-                    response = await asyncio.wait_for(websocket.recv(), timeout=5.0)
-                    data = json.loads(response)
-                    print(f"📥 Text mode response: {data['type']}")
-                except asyncio.TimeoutError:
-                    break
+            # Ends after 5 s without a message (one timer, reset per message)
+            try:
+                async with IdleTimeout(5.0) as idle:
+                    for i in range(3):
+                        response = await websocket.recv()
+                        idle.reset()
+                        data = loads(response)
+                        print(f"📥 Text mode response: {data['type']}")
+            except asyncio.TimeoutError:
+                pass
             
             print("✅ Text mode working correctly")
             
@@ -58,32 +67,29 @@ async def test_speech_mode_switching():
     speech_uri = "ws://localhost:8000/ws/realtime"
     
     try:
-        async with websockets.connect(speech_uri) as websocket:
+        async with websockets.connect(speech_uri, **WS_CONNECT_OPTIONS) as websocket:
             print("✅ Connected to Speech Mode WebSocket")
             
             # Wait for connection to be established
             await asyncio.sleep(1)
             
             # Send a test message to verify connection
-            test_message = {
-                "type": "test",
-                "message": "Testing speech mode connection"
-            }
-            
-            await websocket.send(json.dumps(test_message))
+            await websocket.send(SPEECH_TEST_MESSAGE)
             print("📤 Sent test message to speech mode")
             
             # Listen for responses
             message_count = 0
-            for i in range(5):
-                try:
-                    response = await asyncio.wait_for(websocket.recv(), timeout=2.0)
-                    data = json.loads(response)
-                    message_count += 1
-                    print(f"📥 Speech mode response {message_count}: {data.get('type', 'unknown')}")
-                except asyncio.TimeoutError:
-                    print("⏰ No more responses in speech mode")
-                    break
+            # Ends after 2 s without a message (one timer, reset per message)
+            try:
+                async with IdleTimeout(2.0) as idle:
+                    for i in range(5):
+                        response = await websocket.recv()
+                        idle.reset()
+                        data = loads(response)
+                        message_count += 1
+                        print(f"📥 Speech mode response {message_count}: {data.get('type', 'unknown')}")
+            except asyncio.TimeoutError:
+                print("⏰ No more responses in speech mode")
             
             print("✅ Speech mode WebSocket working correctly")
             
@@ -5,27 +5,29 @@ Test script to verify the speech-to-speech conversation functionality.
 
 import asyncio
 import websockets
-import json
 import time
 
+from ws_test_utils import loads, dumps, WS_CONNECT_OPTIONS, IdleTimeout
+
+# Payloads are constant, so serialize them once at import
+TEST_MESSAGE = dumps({
+    "type": "test",
+    "message": "Testing realtime connection"
+})
+
 async def test_speech_to_speech():
     """Test the speech-to-speech WebSocket endpoint"""
     uri = "ws://localhost:8000/ws/realtime"
     
     try:
-        async with websockets.connect(uri) as websocket:
+        async with websockets.connect(uri, **WS_CONNECT_OPTIONS) as websocket:
             print("✅ Connected to Realtime WebSocket")
             
             # Wait for connection to be established
             await asyncio.sleep(1)
             
             # Send a test message to check if the connection is working
-            test_message = {
-                "type": "test",
-                "message": "Testing realtime connection"
-            }
-            
-            await websocket.send(json.dumps(test_message))
+            await websocket.send(TEST_MESSAGE)
             print("📤 Sent test message")
             
             # Listen for responses for a few seconds
@@ -34,27 +36,29 @@ async def test_speech_to_speech():
             print("💡 For full speech-to-speech testing, use the frontend with microphone access.")
             
             message_count = 0
-            for i in range(10):  # Listen for up to 10 seconds
-                try:
-                    response = await asyncio.wait_for(websocket.recv(), timeout=1.0)
-                    data = json.loads(response)
-                    message_count += 1
-                    print(f"📥 Message {message_count}: {data.get('type', 'unknown')}")
-                    
-                    if data.get('type') == 'error':
-                        print(f"   Error: {data.get('message', 'Unknown error')}")
-                    elif data.get('type') == 'user_speaking_started':
-                        print("   🎤 User started speaking")
-                    elif data.get('type') == 'user_speaking_stopped':
-                        print("   🔇 User stopped speaking")
-                    elif data.get('type') == 'ai_transcript_delta':
-                        print(f"   🤖 AI speaking: {data.get('content', '')}")
-                    elif data.get('type') == 'user_transcript_delta':
-                        print(f"   👤 User speaking: {data.get('content', '')}")
+            # Ends after 1 s without a message (one timer, reset per message)
+            try:
+                async with IdleTimeout(1.0) as idle:
+                    for i in range(10):  # Listen for up to 10 seconds
+                        response = await websocket.recv()
+                        idle.reset()
+                        data = loads(response)
+                        message_count += 1
+                        print(f"📥 Message {message_count}: {data.get('type', 'unknown')}")
                         
-                except asyncio.TimeoutError:
-                    print("⏰ No messages received in this interval")
-                    continue
+                        if data.get('type') == 'error':
+                            print(f"   Error: {data.get('message', 'Unknown error')}")
+                        elif data.get('type') == 'user_speaking_started':
+                            print("   🎤 User started speaking")
+                        elif data.get('type') == 'user_speaking_stopped':
+                            print("   🔇 User stopped speaking")
+                        elif data.get('type') == 'ai_transcript_delta':
+                            print(f"   🤖 AI speaking: {data.get('content', '')}")
+                        elif data.get('type') == 'user_transcript_delta':
+                            print(f"   👤 User speaking: {data.get('content', '')}")
+                            
+            except asyncio.TimeoutError:
+                print("⏰ Listening window ended")
             
             print(f"✅ Test completed. Received {message_count} messages")
             print("✅ Realtime WebSocket connection is working!")
@@ -5,29 +5,31 @@ Test script to verify that the supervisor agent status changes from 'analyzing'
 
 import asyncio
 import websockets
-import json
 import time
 
+from ws_test_utils import loads, dumps, WS_CONNECT_OPTIONS, IdleTimeout
+
+# Payloads are constant, so serialize them once at import
+TEST_MESSAGE = dumps({
+    "type": "user_message",
+    "content": "Hello! Can you help me analyze this conversation and provide some insights about the background agent system?"
+})
+
 async def test_supervisor_status():
     """Test that supervisor agent status changes correctly"""
     uri = "ws://localhost:8000/ws"
     
     try:
-        async with websockets.connect(uri) as websocket:
+        async with websockets.connect(uri, **WS_CONNECT_OPTIONS) as websocket:
             print("✅ Connected to WebSocket")
             
             # Wait for initial agent update
             response = await websocket.recv()
-            data = json.loads(response)
+            data = loads(response)
             print(f"📡 Received initial update: {data['type']}")
             
             # Send a test message that should trigger background agent
-            test_message = {
-                "type": "user_message",
-                "content": "Hello! Can you help me analyze this conversation and provide some insights about the background agent system?"
-            }
-            
-            await websocket.send(json.dumps(test_message))
+            await websocket.send(TEST_MESSAGE)
             print("📤 Sent test message to trigger background agent")
             
             # Monitor agent status changes
@@ -36,46 +38,48 @@ async def test_supervisor_status():
             
             print("\n🔍 Monitoring supervisor agent status changes...")
             
-            for i in range(20):  # Wait for up to 20 messages
-                try:
-                    response = await asyncio.wait_for(websocket.recv(), timeout=10.0)
-                    data = json.loads(response)
-                    message_count += 1
-                    
-                    if data['type'] == 'agent_update':
-                        agent_in_loop = data.get('agent_in_loop', {})
-                        status = agent_in_loop.get('status', 'unknown')
-                        current_task = agent_in_loop.get('current_task', 'No task')
-                        is_active = agent_in_loop.get('is_active', False)
-                        
-                        status_changes.append({
-                            'status': status,
-                            'current_task': current_task,
-                            'is_active': is_active,
-                            'timestamp': time.time()
-                        })
-                        
-                        print(f"📥 Agent Update {len(status_changes)}: Status='{status}', Task='{current_task}', Active={is_active}")
-                        
-                        # Check if we've seen the expected status progression
-                        if len(status_changes) >= 2:
-                            if (status_changes[-2]['status'] == 'analyzing' and 
-                                status_changes[-1]['status'] == 'executing'):
-                                print("✅ SUCCESS: Status changed from 'analyzing' to 'executing'!")
-                                break
-                    
-                    elif data['type'] == 'new_message':
-                        content = data['message']['content']
-                        is_agent_result = data['message'].get('is_agent_result', False)
+            # Ends after 10 s without a message (one timer, reset per message)
+            try:
+                async with IdleTimeout(10.0) as idle:
+                    for i in range(20):  # Wait for up to 20 messages
+                        response = await websocket.recv()
+                        idle.reset()
+                        data = loads(response)
+                        message_count += 1
                         
-                        if is_agent_result:
-                            print(f"🎉 Agent Result: {content[:100]}...")
-                        else:
-                            print(f"💬 Message: {content[:50]}...")
+                        if data['type'] == 'agent_update':
+                            agent_in_loop = data.get('agent_in_loop', {})
+                            status = agent_in_loop.get('status', 'unknown')
+                            current_task = agent_in_loop.get('current_task', 'No task')
+                            is_active = agent_in_loop.get('is_active', False)
+                            
+                            status_changes.append({
+                                'status': status,
+                                'current_task': current_task,
+                                'is_active': is_active,
+                                'timestamp': time.time()
+                            })
+                            
+                            print(f"📥 Agent Update {len(status_changes)}: Status='{status}', Task='{current_task}', Active={is_active}")
+                            
+                            # Check if we've seen the expected status progression
+                            if len(status_changes) >= 2:
+                                if (status_changes[-2]['status'] == 'analyzing' and 
+                                    status_changes[-1]['status'] == 'executing'):
+                                    print("✅ SUCCESS: Status changed from 'analyzing' to 'executing'!")
+                                    break
                         
-                except asyncio.TimeoutError:
-                    print("⏰ Timeout waiting for response")
-                    break
+                        elif data['type'] == 'new_message':
+                            content = data['message']['content']
+                            is_agent_result = data['message'].get('is_agent_result', False)
+                            
+                            if is_agent_result:
+                                print(f"🎉 Agent Result: {content[:100]}...")
+                            else:
+                                print(f"💬 Message: {content[:50]}...")
+                            
+            except asyncio.TimeoutError:
+                print("⏰ Timeout waiting for response")
             
             print(f"\n📊 Test Results:")
             print(f"   Total messages received: {message_count}")
@@ -4,58 +4,277 @@ Test script to verify the voice streaming WebSocket endpoint works correctly.
 """
 
 import asyncio
+import os
+import struct
 import websockets
-import json
 import time
-import base64
 
-async def test_voice_streaming():
-    """Test the voice streaming WebSocket endpoint"""
-    uri = "ws://localhost:8000/ws/voice"
+from ws_test_utils import loads, WS_CONNECT_OPTIONS, IdleTimeout
+
+# pybase64 (libbase64 SIMD kernels) when installed; VOICE_TEST_STDLIB_BASE64=1
+# forces the stdlib codec for A/B checks. The stdlib fallback calls binascii
+# directly, skipping the base64 module's Python wrapper
+try:
+    if os.getenv("VOICE_TEST_STDLIB_BASE64") == "1":
+        raise ImportError
+    from pybase64 import b64encode as _b64encode
+except ImportError:
+    from binascii import b2a_base64
+    _b64encode = lambda data: b2a_base64(data, newline=False)
+
+# Responses are only inspected for a few fields, so prefer simdjson's lazy
+# parser (fields are materialized on access, never the whole document). The
+# parsed document is only valid until the next parse() call.
+try:
+    import simdjson
+    _parse = simdjson.Parser().parse
+except ImportError:
+    _parse = loads
+
+# Optional Cython/libuv client: frame parsing and masking happen outside
+# Python. Used when installed and VOICE_TEST_CLIENT=picows
+try:
+    from picows import ws_connect, WSListener, WSMsgType
+except ImportError:
+    ws_connect = None
+
+# Audio streams through this connection: room for larger frames, and no
+# receive-side backpressure while frames stream through the endpoint
+VOICE_CONNECT_OPTIONS = {
+    **WS_CONNECT_OPTIONS,
+    "max_size": 2**24,
+    "max_queue": None,
+}
+
+AUDIO_MESSAGE_PREFIX = b'{"type":"audio_data","audio":"'
+
+def audio_message_head(pcm: bytes) -> bytes:
+    """Everything of an audio_data message up to the timestamp value.
+
+    Only the timestamp changes between sends of the same audio, so the base64
+    encode and JSON envelope are built once per frame here.
+    """
+    return AUDIO_MESSAGE_PREFIX + _b64encode(pcm) + b'","timestamp_ns":'
+
+def frame_audio_message(buf: bytearray, head: bytes) -> memoryview:
+    """Write ``head`` plus the current timestamp into ``buf`` as one message.
+
+    The message is assembled without an intermediate dict, json.dumps str or
+    UTF-8 re-encode. ``buf`` grows as needed and can be reused for every
+    frame; the returned view is only valid until the next call.
+    """
+    # Integer monotonic timestamp: cheaper to format than a float and immune
+    # to wall-clock steps; the server does not read it
+    suffix = b'%d}' % time.monotonic_ns()
+    end = len(head)
+    total = end + len(suffix)
+    if len(buf) < total:
+        buf.extend(bytes(total - len(buf)))
+    buf[:end] = head
+    buf[end:total] = suffix
+    return memoryview(buf)[:total]
+
+# Binary audio frame: 13-byte header (message type, PCM byte count, send time
+# in seconds) followed by the raw PCM, so no base64 or JSON on either side
+MSG_AUDIO = 1
+AUDIO_FRAME_HEADER = struct.Struct("<BId")
+
+def frame_audio_binary(buf: bytearray, pcm: bytes) -> memoryview:
+    """Write a binary audio frame for ``pcm`` into ``buf`` (reused like frame_audio_message)"""
+    start = AUDIO_FRAME_HEADER.size
+    total = start + len(pcm)
+    if len(buf) < total:
+        buf.extend(bytes(total - len(buf)))
+    AUDIO_FRAME_HEADER.pack_into(buf, 0, MSG_AUDIO, len(pcm), time.time())
+    buf[start:total] = pcm
+    return memoryview(buf)[:total]
+
+# Audio goes out as binary frames, like the frontend; VOICE_TEST_FORMAT=json
+# exercises the legacy base64 text envelope the server still accepts
+BINARY_FRAMES = os.getenv("VOICE_TEST_FORMAT", "binary") == "binary"
+
+# The simulated audio never changes, so its payload (the raw PCM, or the
+# base64 JSON head) is built once at import
+TEST_AUDIO = b"fake_audio_data"
+TEST_AUDIO_PAYLOAD = TEST_AUDIO if BINARY_FRAMES else audio_message_head(TEST_AUDIO)
+
+VOICE_URI = "ws://localhost:8000/ws/voice"
+
+def summarize_response(data) -> tuple:
+    """Pull the printable fields out of one parsed response.
+
+    Returns ``(msg_type, detail)`` as plain strings, so the entry outlives the
+    parsed document (simdjson reuses it on the next parse).
+    """
+    # Look the type up once; every server message carries one
+    try:
+        msg_type = data['type']
+    except KeyError:
+        msg_type = 'unknown'
     
+    detail = None
+    if msg_type == 'transcript':
+        detail = f"   Transcript: {data.get('text', '')}"
+    elif msg_type == 'audio_chunk':
+        audio = data.get('audio', '')
+        # Decoded size straight from the base64 length, no decode
+        size = len(audio) * 3 // 4 - audio[-2:].count('=')
+        detail = f"   Audio chunk received ({size} bytes)"
+    elif msg_type == 'error':
+        detail = f"   Error: {data.get('message', '')}"
+    return msg_type, detail
+
+def print_responses(log: list):
+    """Print the ``(ts_ns, msg_type, detail)`` entries collected during an exchange"""
+    start = log[0][0] if log else 0
+    for message_count, (ts, msg_type, detail) in enumerate(log, 1):
+        print(f"📥 Message {message_count}: {msg_type} (+{(ts - start) / 1e6:.1f} ms)")
+        if detail:
+            print(detail)
+
+async def send_audio_frames(websocket, frames: asyncio.Queue) -> int:
+    """Writer task: send queued audio payloads until a ``None`` sentinel.
+
+    Frames that are already queued go out back to back; the task only yields
+    to the loop when the queue is empty or the socket's write buffer is full.
+    """
+    frame_buf = bytearray()
+    sent = 0
+    while True:
+        payload = await frames.get()
+        while payload is not None:
+            if BINARY_FRAMES:
+                await websocket.send(frame_audio_binary(frame_buf, payload))
+            else:
+                # The UTF-8 JSON envelope must arrive as a text frame
+                await websocket.send(frame_audio_message(frame_buf, payload), text=True)
+            sent += 1
+            try:
+                payload = frames.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+        else:
+            return sent
+
+async def receive_messages(websocket, limit: int = 10, idle_timeout: float = 5.0) -> list:
+    """Reader task: collect up to ``limit`` messages, stopping after ``idle_timeout`` seconds without one.
+
+    Nothing is printed while receiving; the caller prints the returned log
+    once the exchange is over, keeping stdout writes out of the recv loop.
+    """
+    log = []
+    append = log.append
+    parse = _parse
+    summarize = summarize_response
+    now = time.monotonic_ns
+    # One timer for the exchange, reset on every message
     try:
-        async with websockets.connect(uri) as websocket:
+        async with IdleTimeout(idle_timeout) as idle:
+            async for raw in websocket:
+                idle.reset()
+                append((now(), *summarize(parse(raw))))
+                
+                if len(log) >= limit:
+                    break
+                    
+    except asyncio.TimeoutError:
+        print("⏰ Timeout waiting for response")
+    return log
+
+async def run_voice_exchange(websocket):
+    """Send the test audio over an open connection and report the responses"""
+    # Queue a test audio data message (simulated) and run the writer and
+    # reader concurrently on the one connection
+    frames = asyncio.Queue()
+    frames.put_nowait(TEST_AUDIO_PAYLOAD)
+    frames.put_nowait(None)
+    
+    sent, log = await asyncio.gather(
+        send_audio_frames(websocket, frames),
+        receive_messages(websocket),
+    )
+    
+    print(f"📤 Sent {sent} test audio frame(s)")
+    print_responses(log)
+    print(f"✅ Test completed. Received {len(log)} messages")
+
+async def test_voice_streaming(iterations: int = 1):
+    """Test the voice streaming WebSocket endpoint.
+
+    All ``iterations`` share one connection, so repeated runs (e.g. a CI perf
+    gate) pay the TCP and WebSocket handshake only once.
+    """
+    try:
+        async with websockets.connect(VOICE_URI, **VOICE_CONNECT_OPTIONS) as websocket:
             print("✅ Connected to Voice WebSocket")
             
             # Wait a moment for the connection to establish
             await asyncio.sleep(1)
             
-            # Send a test audio data message (simulated)
-            test_audio_data = {
-                "type": "audio_data",
-                "audio": base64.b64encode(b"fake_audio_data").decode('utf-8'),
-                "timestamp": time.time()
-            }
-            
-            await websocket.send(json.dumps(test_audio_data))
-            print("📤 Sent test audio data")
-            
-            # Listen for responses
-            message_count = 0
-            for i in range(10):  # Wait for up to 10 messages
-                try:
-                    response = await asyncio.wait_for(websocket.recv(), timeout=5.0)
-                    data = json.loads(response)
-                    message_count += 1
-                    print(f"📥 Message {message_count}: {data.get('type', 'unknown')}")
-                    
-                    if data.get('type') == 'transcript':
-                        print(f"   Transcript: {data.get('text', '')}")
-                    elif data.get('type') == 'audio_chunk':
-                        print(f"   Audio chunk received (length: {len(data.get('audio', ''))})")
-                    elif data.get('type') == 'error':
-                        print(f"   Error: {data.get('message', '')}")
-                        
-                except asyncio.TimeoutError:
-                    print("⏰ Timeout waiting for response")
-                    break
-            
-            print(f"✅ Test completed. Received {message_count} messages")
+            for _ in range(iterations):
+                await run_voice_exchange(websocket)
             
     except Exception as e:
         print(f"❌ Test failed: {e}")
         print("💡 Make sure the API server is running with: python start_server.py")
 
+async def test_voice_streaming_picows(limit: int = 10, idle_timeout: float = 5.0):
+    """Same exchange as test_voice_streaming() over the picows client"""
+    loop = asyncio.get_running_loop()
+    finished = loop.create_future()
+    
+    class VoiceListener(WSListener):
+        def __init__(self):
+            self.log = []
+            self.idle = None  # IdleTimeout of the current wait, reset per message
+        
+        def on_ws_frame(self, transport, frame):
+            # The frame payload is only valid inside this callback. The server
+            # sends its JSON messages as binary frames (UTF-8 bytes), which
+            # parse exactly like text frames, as in the frontend
+            if frame.msg_type not in (WSMsgType.TEXT, WSMsgType.BINARY) or finished.done():
+                return
+            if self.idle is not None:
+                self.idle.reset()
+            self.log.append((time.monotonic_ns(), *summarize_response(_parse(frame.get_payload_as_bytes()))))
+            if len(self.log) >= limit:
+                finished.set_result(None)
+        
+        def on_ws_disconnected(self, transport):
+            if not finished.done():
+                finished.set_result(None)
+    
+    try:
+        transport, listener = await ws_connect(VoiceListener, VOICE_URI)
+        print("✅ Connected to Voice WebSocket (picows)")
+        
+        # Wait a moment for the connection to establish
+        await asyncio.sleep(1)
+        
+        if BINARY_FRAMES:
+            transport.send(WSMsgType.BINARY, frame_audio_binary(bytearray(), TEST_AUDIO_PAYLOAD))
+        else:
+            transport.send(WSMsgType.TEXT, frame_audio_message(bytearray(), TEST_AUDIO_PAYLOAD))
+        print("📤 Sent 1 test audio frame(s)")
+        
+        try:
+            async with IdleTimeout(idle_timeout) as idle:
+                listener.idle = idle
+                await finished
+        except asyncio.TimeoutError:
+            print("⏰ Timeout waiting for response")
+        finally:
+            listener.idle = None
+        
+        transport.disconnect()
+        await transport.wait_disconnected()
+        print_responses(listener.log)
+        print(f"✅ Test completed. Received {len(listener.log)} messages")
+        
+    except Exception as e:
+        print(f"❌ Test failed: {e}")
+        print("💡 Make sure the API server is running with: python start_server.py")
+
 if __name__ == "__main__":
     print("🧪 Testing Voice Streaming WebSocket...")
     print("📋 This test verifies:")
@@ -63,4 +282,14 @@ if __name__ == "__main__":
     print("   - Audio data message handling")
     print("   - Response message types")
     print("")
-    asyncio.run(test_voice_streaming())
+    try:
+        # libuv-backed loop for lower per-callback overhead; uvloop has no
+        # Windows build, which keeps the default selector loop
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
+    if os.getenv("VOICE_TEST_CLIENT") == "picows" and ws_connect is not None:
+        asyncio.run(test_voice_streaming_picows())
+    else:
+        asyncio.run(test_voice_streaming(int(os.getenv("VOICE_TEST_ITERATIONS", "1"))))
@@ -0,0 +1,60 @@
+"""
+Helpers shared by the WebSocket test scripts (api/examples and
+api/test_background_agents.py).
+"""
+
+import asyncio
+import json
+
+# orjson when installed, stdlib json otherwise
+try:
+    import orjson
+    loads = orjson.loads
+    # The server reads with receive_text(), so keep sending text frames
+    dumps = lambda obj: orjson.dumps(obj).decode()
+except ImportError:
+    loads = json.loads
+    dumps = json.dumps
+
+# Client settings for websockets.connect(). The server turns permessage-deflate
+# off (ws_per_message_deflate=False in start_server.py), so the client does not
+# offer it either; the messages are small JSON or raw audio, where deflate
+# costs more CPU than it saves. max_size caps a single incoming frame,
+# write_limit is the send buffer's high-water mark
+WS_CONNECT_OPTIONS = {
+    "compression": None,
+    "max_size": 2**23,
+    "write_limit": 2**20,
+}
+
+try:
+    from asyncio import timeout as _timeout  # Python 3.11+
+except ImportError:
+    from async_timeout import timeout as _timeout
+
+class IdleTimeout:
+    """Async context manager that raises asyncio.TimeoutError after ``seconds``
+    without a reset().
+
+    One timer covers a whole receive loop instead of one per recv(); calling
+    reset() after every message keeps the per-message semantics, so only a
+    silent socket ends the loop, not a long exchange.
+    """
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self._loop = None
+        self._cm = None
+
+    async def __aenter__(self):
+        self._loop = asyncio.get_running_loop()
+        self._cm = _timeout(self.seconds)
+        await self._cm.__aenter__()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return await self._cm.__aexit__(exc_type, exc, tb)
+
+    def reset(self):
+        """Restart the countdown from now"""
+        self._cm.reschedule(self._loop.time() + self.seconds)
@@ -6,24 +6,79 @@ for real-time communication with the React frontend.
 """
 
 import asyncio
-import base64
 import json
+import logging
+import struct
 import time
-from typing import Dict, List, Optional, Any
+from collections import deque
+from itertools import count, islice
+from typing import Deque, Dict, List, Optional, Any, Set
 from datetime import datetime
 from pydantic import BaseModel
 
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
+from fastapi.websockets import WebSocketState
 from fastapi.staticfiles import StaticFiles
 import uvicorn
 
-# Custom JSON encoder for datetime objects
-class DateTimeEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, datetime):
-            return obj.isoformat()
-        return super().default(obj)
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse
+except ImportError:
+    orjson = None
+    ORJSONResponse = None
+
+# Exceptions that mean the client socket is gone: Starlette's disconnect, the
+# websockets library's close, uvicorn's ClientDisconnected on send, and the
+# RuntimeError Starlette raises for receive/send after close. The optional
+# ones fall back to WebSocketDisconnect (a harmless duplicate in the tuple)
+try:
+    from websockets.exceptions import ConnectionClosed
+except ImportError:
+    ConnectionClosed = WebSocketDisconnect
+try:
+    from uvicorn.protocols.utils import ClientDisconnected
+except ImportError:
+    ClientDisconnected = WebSocketDisconnect
+CONNECTION_CLOSED_ERRORS = (WebSocketDisconnect, ConnectionClosed, ClientDisconnected, RuntimeError)
+
+# pybase64 (SIMD) when installed, stdlib otherwise; same b64encode signature
+try:
+    from pybase64 import b64encode
+except ImportError:
+    from base64 import b64encode
+
+def dumps(obj) -> bytes:
+    """Serialize an outbound WebSocket message to UTF-8 JSON bytes.
+
+    Messages go out with send_bytes(), so orjson's output is sent as is with
+    no str round-trip; the frontend decodes binary frames before parsing.
+    Models are converted with model_data() first, so no datetimes reach the
+    stdlib fallback.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+def model_data(model: BaseModel) -> dict:
+    """JSON-ready dict of a model, datetimes already rendered as ISO 8601 strings"""
+    if hasattr(model, "model_dump"):
+        return model.model_dump(mode="json")
+    # Pydantic v1: .json() renders datetimes the same way
+    return json.loads(model.json())
+
+def loads(data):
+    """Parse an inbound WebSocket message (str or bytes).
+
+    orjson's parser is several times faster than json's on the multi-KB
+    base64 strings in audio messages; its JSONDecodeError subclasses
+    json.JSONDecodeError, so callers catch the same exception either way.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
 
 # Import our existing background agent system
 import sys
@@ -33,66 +88,91 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from simple_background_agent import (
     create_background_task, 
     get_task_status, 
+    get_task_event,
+    release_task_event,
     cleanup_old_tasks,
     get_conversation_history
 )
 
 # Import OpenAI for real AI responses
-from openai import AsyncOpenAI
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
 from dotenv import load_dotenv
 
 # Import realtime service for speech-to-speech
 from realtime_service import realtime_service
 
+# Per-delta/per-frame diagnostics go through logging at DEBUG so they cost
+# nothing (no formatting, no stdout write) unless debug logging is enabled
+logger = logging.getLogger(__name__)
+
+# Cap on queued outbound audio frames per voice connection (~80s of 20ms
+# audio chunks); a client that falls further behind loses the oldest audio.
+# Control frames (transcripts, events, errors) are never dropped
+OUTBOX_MAX_AUDIO_FRAMES = 4096
+
+# Binary audio frames from the client: type byte, payload length, send time
+# (seconds since the epoch), then the raw audio bytes. Text frames carry JSON
+# control messages
+MSG_AUDIO = 1
+AUDIO_FRAME_HEADER = struct.Struct("<BId")
+
+# Realtime session settings, identical for every voice connection
+VOICE_SESSION_CONFIG = {
+    "type": "realtime",
+    "model": "gpt-realtime",
+    "audio": {
+        "input": {
+            "format": {
+                "type": "audio/pcm",
+                "rate": 24000
+            },
+            "transcription": {
+                "model": "gpt-4o-mini-transcribe"
+            },
+            "turn_detection": {"type": "semantic_vad"}
+        },
+        "output": {
+            "format": {
+                "type": "audio/pcm", 
+                "rate": 24000
+            },
+            "voice": "alloy"
+        }
+    },
+    "instructions": "Be concise and friendly. You are from US and speak in US English. Do not say a lot of things, give some time to the user to answer.",
+}
+
 # Voice streaming service for frontend-to-backend voice communication
 class VoiceStreamingService:
     def __init__(self, websocket: WebSocket, connection_id: str):
         self.websocket = websocket
         self.connection_id = connection_id
-        self.openai_client = AsyncOpenAI()
         self.realtime_connection = None
         self.connection_context = None
         self.audio_buffer = []
         self.is_connected = False
         self.event_task = None
+        # Outbound frames; the endpoint task drains this and is the only
+        # writer on the socket, so event handling never races handle_message.
+        # Entries are bytes, or a one-item list for audio so an evicted chunk
+        # can be emptied in place (see _enqueue_audio and take_frame)
+        self.outbox: asyncio.Queue = asyncio.Queue()
+        self._queued_audio: deque = deque()  # live audio entries, oldest first
         # Message buffering for complete responses
         self.current_response_text = ""
-        self.current_response_audio = []
         self.is_response_in_progress = False
         
     async def start(self):
         """Start the voice streaming service"""
         try:
             # Connect to OpenAI Realtime API using proper async context manager
-            self.realtime_connection = self.openai_client.realtime.connect(model="gpt-realtime")
+            # Module-level client: one HTTP pool shared by every connection
+            self.realtime_connection = openai_client.realtime.connect(model="gpt-realtime")
             self.connection_context = await self.realtime_connection.__aenter__()
             self.is_connected = True
             
             # Configure the session
-            await self.connection_context.session.update(session={
-                "type": "realtime",
-                "model": "gpt-realtime",
-                "audio": {
-                    "input": {
-                        "format": {
-                            "type": "audio/pcm",
-                            "rate": 24000
-                        },
-                        "transcription": {
-                            "model": "gpt-4o-mini-transcribe"
-                        },
-                        "turn_detection": {"type": "semantic_vad"}
-                    },
-                    "output": {
-                        "format": {
-                            "type": "audio/pcm", 
-                            "rate": 24000
-                        },
-                        "voice": "alloy"
-                    }
-                },
-                "instructions": "Be concise and friendly. You are from US and speak in US English. Do not say a lot of things, give some time to the user to answer.",
-            })
+            await self.connection_context.session.update(session=VOICE_SESSION_CONFIG)
             
             # Start listening for OpenAI events
             self.event_task = asyncio.create_task(self._handle_openai_events())
@@ -101,7 +181,7 @@ class VoiceStreamingService:
             
         except Exception as e:
             print(f"[VoiceStreaming] Error starting service: {e}")
-            await self._send_error(f"Failed to start voice streaming: {str(e)}")
+            self._send_error(f"Failed to start voice streaming: {str(e)}")
     
     async def handle_message(self, message_data: dict):
         """Handle incoming WebSocket messages from frontend"""
@@ -119,7 +199,32 @@ class VoiceStreamingService:
                 
         except Exception as e:
             print(f"[VoiceStreaming] Error handling message: {e}")
-            await self._send_error(f"Error processing message: {str(e)}")
+            self._send_error(f"Error processing message: {str(e)}")
+    
+    async def handle_audio_frame(self, frame: bytes):
+        """Handle a binary audio frame from frontend (AUDIO_FRAME_HEADER + audio)"""
+        try:
+            if not self.is_connected or not self.connection_context:
+                return
+            
+            if len(frame) < AUDIO_FRAME_HEADER.size:
+                print(f"[VoiceStreaming] Short binary frame ({len(frame)} bytes)")
+                return
+            msg_type, length, _ = AUDIO_FRAME_HEADER.unpack_from(frame)
+            if msg_type != MSG_AUDIO:
+                print(f"[VoiceStreaming] Unknown binary frame type: {msg_type}")
+                return
+            
+            # Slice without copying; the SDK only accepts base64, so the raw
+            # bytes are encoded exactly once, here
+            start = AUDIO_FRAME_HEADER.size
+            audio = memoryview(frame)[start:start + length]
+            await self.connection_context.input_audio_buffer.append(
+                audio=b64encode(audio).decode("ascii")
+            )
+            
+        except Exception as e:
+            print(f"[VoiceStreaming] Error handling audio frame: {e}")
     
     async def _handle_audio_data(self, message_data: dict):
         """Handle audio data from frontend"""
@@ -131,9 +236,8 @@ class VoiceStreamingService:
             if not audio_base64:
                 return
             
-            # Convert base64 to bytes and send to OpenAI
-            audio_bytes = base64.b64decode(audio_base64)
-            
+            # The SDK takes base64 anyway, so forward the string untouched
+            # instead of decoding it just to have it re-encoded.
             # For WebM/Opus format from frontend, we need to handle it differently
             # For now, we'll send it directly to OpenAI's input buffer
             await self.connection_context.input_audio_buffer.append(
@@ -150,122 +254,130 @@ class VoiceStreamingService:
                 await self._process_openai_event(event)
         except Exception as e:
             print(f"[VoiceStreaming] Error in OpenAI event loop: {e}")
-            await self._send_error(f"OpenAI connection error: {str(e)}")
+            self._send_error(f"OpenAI connection error: {str(e)}")
     
     async def _process_openai_event(self, event):
         """Process individual OpenAI events"""
         try:
             event_type = event.type
+            # One clock read per event, shared by everything it sends
+            ts = time.time()
             
             if event_type == "response.output_audio.delta":
-                # Buffer audio chunk instead of sending immediately
-                self.current_response_audio.append(event.delta)
+                # Stream audio as it arrives so playback starts with the first
+                # chunk instead of after the whole response
+                self._send_audio_chunk(event.delta, ts)
                 self.is_response_in_progress = True
-                print(f"[VoiceStreaming] Buffered audio chunk, total chunks: {len(self.current_response_audio)}")
                 
             elif event_type == "response.output_audio_transcript.delta":
                 # Buffer transcript delta instead of sending immediately
                 self.current_response_text += event.delta
                 self.is_response_in_progress = True
-                print(f"[VoiceStreaming] Buffered text delta: '{event.delta}', current text: '{self.current_response_text}'")
+                logger.debug("[VoiceStreaming] Buffered text delta: %r, current text: %r", event.delta, self.current_response_text)
                 
             elif event_type == "response.output_audio_transcript.done":
                 # Send complete AI transcript
                 transcript = getattr(event, 'transcript', '')
                 if transcript:
-                    await self._send_transcript(transcript, is_user=False, is_complete=True)
+                    self._send_transcript(transcript, is_user=False, is_complete=True, ts=ts)
                     
             elif event_type == "conversation.item.input_audio_transcription.delta":
                 # Send user transcript delta
-                await self._send_transcript(event.delta, is_user=True)
+                self._send_transcript(event.delta, is_user=True, ts=ts)
                 
             elif event_type == "conversation.item.input_audio_transcription.completed":
                 # Send complete user transcript
                 transcript = event.transcript
-                await self._send_transcript(transcript, is_user=True, is_complete=True)
+                self._send_transcript(transcript, is_user=True, is_complete=True, ts=ts)
                 
             elif event_type == "input_audio_buffer.speech_started":
-                await self._send_event("speech_started", {"is_user": True})
+                self._send_event("speech_started", {"is_user": True}, ts)
                 
             elif event_type == "input_audio_buffer.speech_stopped":
-                await self._send_event("speech_ended", {"is_user": True})
+                self._send_event("speech_ended", {"is_user": True}, ts)
                 
             elif event_type == "response.started":
-                await self._send_event("speech_started", {"is_user": False})
+                self._send_event("speech_started", {"is_user": False}, ts)
                 
             elif event_type == "response.done":
                 # Send complete buffered response
-                await self._send_complete_response()
+                self._send_complete_response(ts)
                 self._reset_response_buffer()
-                await self._send_event("speech_ended", {"is_user": False})
+                self._send_event("speech_ended", {"is_user": False}, ts)
                 
             elif event_type == "error":
                 error_msg = getattr(event, 'error', str(event))
-                await self._send_error(f"OpenAI error: {error_msg}")
+                self._send_error(f"OpenAI error: {error_msg}", ts)
                 
         except Exception as e:
             print(f"[VoiceStreaming] Error processing OpenAI event: {e}")
     
-    async def _send_audio_chunk(self, audio_delta: str):
-        """Send audio chunk to frontend"""
-        try:
-            await self.websocket.send_text(json.dumps({
-                "type": "audio_chunk",
-                "audio": audio_delta,
-                "timestamp": time.time()
-            }))
-        except Exception as e:
-            print(f"[VoiceStreaming] Error sending audio chunk: {e}")
+    def _enqueue(self, payload: bytes):
+        """Queue a serialized control frame (never dropped)"""
+        self.outbox.put_nowait(payload)
     
-    async def _send_transcript(self, text: str, is_user: bool, is_complete: bool = False):
-        """Send transcript to frontend"""
-        try:
-            await self.websocket.send_text(json.dumps({
-                "type": "transcript",
-                "text": text,
-                "is_user": is_user,
-                "is_complete": is_complete,
-                "timestamp": time.time()
-            }))
-        except Exception as e:
-            print(f"[VoiceStreaming] Error sending transcript: {e}")
+    def _enqueue_audio(self, payload: bytes):
+        """Queue a serialized audio frame, evicting the oldest queued audio past the cap"""
+        entry = [payload]
+        self._queued_audio.append(entry)
+        self.outbox.put_nowait(entry)
+        if len(self._queued_audio) > OUTBOX_MAX_AUDIO_FRAMES:
+            # Free the oldest chunk now; its empty entry is skipped when drained
+            self._queued_audio.popleft()[0] = None
+            logger.debug("[VoiceStreaming] Outbox full for %s, dropped oldest audio frame", self.connection_id)
     
-    async def _send_event(self, event_type: str, data: dict):
-        """Send event to frontend"""
-        try:
-            await self.websocket.send_text(json.dumps({
-                "type": event_type,
-                **data,
-                "timestamp": time.time()
-            }))
-        except Exception as e:
-            print(f"[VoiceStreaming] Error sending event: {e}")
+    def take_frame(self, entry) -> Optional[bytes]:
+        """Bytes to send for an entry taken from the outbox; None for evicted audio"""
+        if type(entry) is bytes:
+            return entry
+        payload = entry[0]
+        if payload is not None:
+            # Older audio entries were sent or evicted already: this is the front
+            self._queued_audio.popleft()
+        return payload
     
-    async def _send_error(self, error_message: str):
-        """Send error to frontend"""
-        try:
-            await self.websocket.send_text(json.dumps({
-                "type": "error",
-                "message": error_message,
-                "timestamp": time.time()
-            }))
-        except Exception as e:
-            print(f"[VoiceStreaming] Error sending error message: {e}")
+    def _send_audio_chunk(self, audio_delta: str, ts: Optional[float] = None):
+        """Queue audio chunk for the frontend"""
+        self._enqueue_audio(dumps({
+            "type": "audio_chunk",
+            "audio": audio_delta,
+            "timestamp": ts or time.time()
+        }))
+    
+    def _send_transcript(self, text: str, is_user: bool, is_complete: bool = False, ts: Optional[float] = None):
+        """Queue transcript for the frontend"""
+        self._enqueue(dumps({
+            "type": "transcript",
+            "text": text,
+            "is_user": is_user,
+            "is_complete": is_complete,
+            "timestamp": ts or time.time()
+        }))
+    
+    def _send_event(self, event_type: str, data: dict, ts: Optional[float] = None):
+        """Queue event for the frontend"""
+        self._enqueue(dumps({
+            "type": event_type,
+            **data,
+            "timestamp": ts or time.time()
+        }))
     
-    async def _send_complete_response(self):
+    def _send_error(self, error_message: str, ts: Optional[float] = None):
+        """Queue error for the frontend"""
+        self._enqueue(dumps({
+            "type": "error",
+            "message": error_message,
+            "timestamp": ts or time.time()
+        }))
+    
+    def _send_complete_response(self, ts: Optional[float] = None):
         """Send complete buffered response to frontend"""
         try:
-            print(f"[VoiceStreaming] Sending complete response - Text: '{self.current_response_text}', Audio chunks: {len(self.current_response_audio)}")
+            logger.debug("[VoiceStreaming] Sending complete response - Text: %r", self.current_response_text)
             
-            # Send complete text if available
+            # Send complete text if available (audio was already streamed)
             if self.current_response_text.strip():
-                await self._send_transcript(self.current_response_text, is_user=False, is_complete=True)
-            
-            # Send complete audio if available
-            if self.current_response_audio:
-                # Combine all audio chunks into one
-                combined_audio = "".join(self.current_response_audio)
-                await self._send_audio_chunk(combined_audio)
+                self._send_transcript(self.current_response_text, is_user=False, is_complete=True, ts=ts)
                 
         except Exception as e:
             print(f"[VoiceStreaming] Error sending complete response: {e}")
@@ -273,7 +385,6 @@ class VoiceStreamingService:
     def _reset_response_buffer(self):
         """Reset the response buffer"""
         self.current_response_text = ""
-        self.current_response_audio = []
         self.is_response_in_progress = False
     
     async def cleanup(self):
@@ -303,8 +414,15 @@ class VoiceStreamingService:
 # Load environment variables
 load_dotenv()
 
-# Initialize OpenAI client
-openai_client = AsyncOpenAI()
+# Initialize OpenAI client (shared by the chat endpoint and every voice connection).
+# Its pooled HTTP client keeps connections warm; HTTP/2 when h2 is installed.
+# The SDK's default client keeps its own timeouts and connection limits
+try:
+    import h2  # noqa: F401
+    HTTP2 = True
+except ImportError:
+    HTTP2 = False
+openai_client = AsyncOpenAI(http_client=DefaultAsyncHttpxClient(http2=HTTP2))
 
 # Pydantic models for API
 class Message(BaseModel):
@@ -343,7 +461,9 @@ class SubAgent(BaseModel):
 app = FastAPI(
     title="Agent in the Loop API",
     description="API for the Agent in the Loop chatbot interface",
-    version="1.0.0"
+    version="1.0.0",
+    # REST responses encoded by orjson too when it is installed
+    default_response_class=ORJSONResponse or JSONResponse
 )
 
 # CORS middleware for frontend integration
@@ -355,11 +475,43 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Messages kept in memory (oldest evicted first) and how many of the most
+# recent ones go to the model as context
+HISTORY_MAX_MESSAGES = 50
+CONTEXT_MESSAGES = 10
+
+CHAT_SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": "You are a helpful AI assistant. Be concise, friendly, and helpful. You have background agents that can help with various tasks like sending emails, updating calendars, or fetching notes."
+}
+# Message.type -> chat completion role
+CHAT_ROLES = {"user": "user", "ai": "assistant"}
+
+# Repeated updates with the same agent_in_loop status within this window go
+# out as one agent_update per client; a status change is sent at once
+AGENT_UPDATE_DEBOUNCE = 0.05
+
 # WebSocket connection manager
 class ConnectionManager:
     def __init__(self):
-        self.active_connections: List[WebSocket] = []
-        self.conversation_history: List[Message] = []
+        # Set: O(1) add/discard on connect, disconnect and failed sends
+        self.active_connections: Set[WebSocket] = set()
+        self.conversation_history: Deque[Message] = deque(maxlen=HISTORY_MAX_MESSAGES)
+        # Each history message serialized once on append (kept in step with
+        # conversation_history), plus the assembled GET /conversation/history
+        # body, rebuilt only after the history changes
+        self._history_json: Deque[bytes] = deque(maxlen=HISTORY_MAX_MESSAGES)
+        self._history_body: Optional[bytes] = None
+        # Serialized agent_update message, rebuilt only after a status change
+        self._agent_update_cache: Optional[bytes] = None
+        # Clients owed an agent_update, and the timer that will send it
+        self._pending_updates: Set[WebSocket] = set()
+        self._update_flush: Optional[asyncio.Task] = None
+        # agent_in_loop.status in the last agent_update sent to each client
+        self._sent_status: Dict[WebSocket, str] = {}
+        # Process-wide message id sequence (second-resolution timestamps
+        # collided when two messages landed in the same second)
+        self._message_ids = count(1)
         self.agent_in_loop: AgentInLoopStatus = AgentInLoopStatus(
             is_active=False,
             current_task=None,
@@ -373,89 +525,145 @@ class ConnectionManager:
         ]
         self.active_tasks: Dict[str, str] = {}  # task_id -> agent_id mapping
 
+    @property
+    def agent_in_loop(self) -> AgentInLoopStatus:
+        return self._agent_in_loop
+
+    @agent_in_loop.setter
+    def agent_in_loop(self, status: AgentInLoopStatus):
+        self._agent_in_loop = status
+        self._agent_update_cache = None
+
+    def reset_sub_agents(self):
+        """Set every sub-agent back to idle"""
+        for agent in self.sub_agents:
+            agent.status = "idle"
+        self._agent_update_cache = None
+
+    def next_message_id(self, prefix: str) -> str:
+        """Unique message id with the given prefix, e.g. user_42"""
+        return f"{prefix}_{next(self._message_ids)}"
+
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
-        self.active_connections.append(websocket)
+        self.active_connections.add(websocket)
         print(f"[API] Client connected. Total connections: {len(self.active_connections)}")
 
     def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
+        self.active_connections.discard(websocket)
+        self._sent_status.pop(websocket, None)
         print(f"[API] Client disconnected. Total connections: {len(self.active_connections)}")
 
-    async def send_personal_message(self, message: str, websocket: WebSocket):
+    async def send_personal_message(self, message: bytes, websocket: WebSocket):
         try:
             # Check if connection is still open before sending
-            if websocket.client_state.name != "CONNECTED":
+            if websocket.client_state is not WebSocketState.CONNECTED:
                 print("[API] Connection closed, removing from active connections")
-                if websocket in self.active_connections:
-                    self.active_connections.remove(websocket)
+                self.active_connections.discard(websocket)
                 return False
             
-            await websocket.send_text(message)
+            await websocket.send_bytes(message)
             return True
         except Exception as e:
             print(f"[API] Error sending message: {e}")
             # Remove dead connection
-            if websocket in self.active_connections:
-                self.active_connections.remove(websocket)
+            self.active_connections.discard(websocket)
             return False
 
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message)
-            except:
-                # Remove dead connections
-                self.active_connections.remove(connection)
+    async def broadcast(self, message: bytes):
+        # Send to everyone concurrently, then drop dead connections in one pass
+        # (removing while iterating skipped the entry after each dead socket)
+        connections = list(self.active_connections)
+        results = await asyncio.gather(
+            *(connection.send_bytes(message) for connection in connections),
+            return_exceptions=True
+        )
+        dead = {c for c, r in zip(connections, results) if isinstance(r, Exception)}
+        self.active_connections -= dead
 
     async def send_agent_update(self, websocket: WebSocket):
         """Send current agent status to client"""
-        update = {
-            "type": "agent_update",
-            "agent_in_loop": self.agent_in_loop.dict(),
-            "sub_agents": [agent.dict() for agent in self.sub_agents]
-        }
-        success = await self.send_personal_message(json.dumps(update, cls=DateTimeEncoder), websocket)
+        if self._agent_update_cache is None:
+            self._agent_update_cache = dumps({
+                "type": "agent_update",
+                "agent_in_loop": model_data(self.agent_in_loop),
+                "sub_agents": [model_data(agent) for agent in self.sub_agents]
+            })
+        self._sent_status[websocket] = self.agent_in_loop.status
+        success = await self.send_personal_message(self._agent_update_cache, websocket)
         if not success:
             print("[API] Failed to send agent update, connection may be closed")
 
+    async def schedule_agent_update(self, websocket: WebSocket):
+        """Send the agent status to a client.
+
+        A change of agent_in_loop.status since the client's last update goes
+        out immediately, so no transition (e.g. "analyzing") is skipped;
+        repeats of the same status are coalesced over the debounce window.
+        """
+        if self._sent_status.get(websocket) != self.agent_in_loop.status:
+            self._pending_updates.discard(websocket)
+            await self.send_agent_update(websocket)
+            return
+        self._pending_updates.add(websocket)
+        if self._update_flush is None:
+            self._update_flush = asyncio.create_task(self._flush_agent_updates())
+
+    async def _flush_agent_updates(self):
+        """After the debounce window, send the latest status once to each pending client"""
+        try:
+            await asyncio.sleep(AGENT_UPDATE_DEBOUNCE)
+        finally:
+            pending, self._pending_updates = self._pending_updates, set()
+            self._update_flush = None
+        await asyncio.gather(*(self.send_agent_update(websocket) for websocket in pending))
+
     async def send_message(self, message: Message, websocket: WebSocket):
         """Send a new message to client"""
         message_data = {
             "type": "new_message",
-            "message": message.dict()
+            "message": model_data(message)
         }
-        success = await self.send_personal_message(json.dumps(message_data, cls=DateTimeEncoder), websocket)
+        success = await self.send_personal_message(dumps(message_data), websocket)
         if not success:
             print("[API] Failed to send message, connection may be closed")
 
     def add_message(self, message: Message):
         """Add message to conversation history"""
         self.conversation_history.append(message)
+        self._history_json.append(dumps(model_data(message)))
+        self._history_body = None
+
+    def clear_history(self):
+        """Drop all conversation history"""
+        self.conversation_history.clear()
+        self._history_json.clear()
+        self._history_body = None
+
+    def history_json(self) -> bytes:
+        """Serialized {"messages": [...], "total": n} document for the history endpoint"""
+        if self._history_body is None:
+            self._history_body = (
+                b'{"messages":[' + b",".join(self._history_json)
+                + b'],"total":%d}' % len(self._history_json)
+            )
+        return self._history_body
     
     async def generate_ai_response(self, user_message: str) -> str:
         """Generate AI response using OpenAI"""
         try:
             # Build conversation context from recent messages
-            recent_messages = self.conversation_history[-10:]  # Last 10 messages for context
+            history = self.conversation_history
+            recent_messages = islice(history, max(0, len(history) - CONTEXT_MESSAGES), None)
             
-            # Create messages for OpenAI API
-            messages = [
-                {
-                    "role": "system", 
-                    "content": "You are a helpful AI assistant. Be concise, friendly, and helpful. You have background agents that can help with various tasks like sending emails, updating calendars, or fetching notes."
-                }
-            ]
-            
-            # Add recent conversation history
-            for msg in recent_messages:
-                if msg.type == "user":
-                    messages.append({"role": "user", "content": msg.content})
-                elif msg.type == "ai":
-                    messages.append({"role": "assistant", "content": msg.content})
-            
-            # Add current user message
+            # Create messages for OpenAI API: system prompt, recent history
+            # (only user/ai messages have a chat role), then the current message
+            messages = [CHAT_SYSTEM_MESSAGE]
+            messages.extend(
+                {"role": role, "content": msg.content}
+                for msg in recent_messages
+                if (role := CHAT_ROLES.get(msg.type))
+            )
             messages.append({"role": "user", "content": user_message})
             
             # Call OpenAI API
@@ -473,7 +681,7 @@ class ConnectionManager:
             # Fallback response
             return f"I understand you said: '{user_message}'. Let me help you with that."
 
-    async def trigger_agent_in_loop(self, user_message: str, ai_response: str, websocket: WebSocket):
+    async def trigger_agent_in_loop(self, user_message: str, ai_response: str, websocket: WebSocket, conversation_id: str):
         """Trigger the agent in the loop system"""
         # Activate agent in the loop
         self.agent_in_loop = AgentInLoopStatus(
@@ -483,10 +691,10 @@ class ConnectionManager:
         )
         
         # Send initial update
-        await self.send_agent_update(websocket)
+        await self.schedule_agent_update(websocket)
         
         # Create background task
-        task_id = create_background_task(user_message, ai_response, None)
+        task_id = create_background_task(user_message, ai_response, None, conversation_id)
         self.active_tasks[task_id] = "conversation_analysis"
         
         # Start monitoring task
@@ -494,8 +702,18 @@ class ConnectionManager:
 
     async def _monitor_task(self, task_id: str, websocket: WebSocket):
         """Monitor a background task and update UI accordingly"""
+        # Woken by the agent's worker thread on every status change instead of
+        # polling; clearing before each read means no transition is missed
+        changed = get_task_event(task_id)
+        try:
+            await self._watch_task(task_id, changed, websocket)
+        finally:
+            release_task_event(task_id)
+
+    async def _watch_task(self, task_id: str, changed: asyncio.Event, websocket: WebSocket):
         last_status = None
         while task_id in self.active_tasks:
+            changed.clear()
             status = get_task_status(task_id)
             
             # Update agent status when task status changes to running
@@ -505,7 +723,7 @@ class ConnectionManager:
                     current_task="Running background analysis...",
                     status="executing"
                 )
-                await self.send_agent_update(websocket)
+                await self.schedule_agent_update(websocket)
                 print(f"[API] Updated agent status to 'executing' for task {task_id}")
             
             if status['status'] == 'completed':
@@ -516,7 +734,7 @@ class ConnectionManager:
                 break
             
             last_status = status['status']
-            await asyncio.sleep(0.5)  # Check every 500ms
+            await changed.wait()
 
     async def _handle_task_completion(self, task_id: str, status: Dict, websocket: WebSocket):
         """Handle successful task completion"""
@@ -525,7 +743,7 @@ class ConnectionManager:
         
         # Create agent result message
         agent_message = Message(
-            id=f"agent_{int(time.time())}",
+            id=self.next_message_id("agent"),
             type="ai",
             content=f"🧠 {message}",
             timestamp=datetime.now(),
@@ -543,11 +761,10 @@ class ConnectionManager:
         )
         
         # Reset sub-agents
-        for agent in self.sub_agents:
-            agent.status = "idle"
+        self.reset_sub_agents()
         
         # Send final update
-        await self.send_agent_update(websocket)
+        await self.schedule_agent_update(websocket)
         
         # Clean up
         if task_id in self.active_tasks:
@@ -559,7 +776,7 @@ class ConnectionManager:
         
         # Create error message
         error_message = Message(
-            id=f"error_{int(time.time())}",
+            id=self.next_message_id("error"),
             type="ai",
             content=f"❌ Background task failed: {error}",
             timestamp=datetime.now(),
@@ -577,11 +794,10 @@ class ConnectionManager:
         )
         
         # Reset sub-agents
-        for agent in self.sub_agents:
-            agent.status = "idle"
+        self.reset_sub_agents()
         
         # Send final update
-        await self.send_agent_update(websocket)
+        await self.schedule_agent_update(websocket)
         
         # Clean up
         if task_id in self.active_tasks:
@@ -609,35 +825,57 @@ async def voice_websocket_endpoint(websocket: WebSocket):
         except Exception as e:
             print(f"[API] Error starting voice streaming service: {e}")
             # Send error to frontend but don't close connection
-            await websocket.send_text(json.dumps({
+            await websocket.send_bytes(dumps({
                 "type": "error",
                 "message": f"Failed to start voice streaming: {str(e)}"
             }))
         
-        # Handle incoming messages
-        while True:
-            try:
-                data = await asyncio.wait_for(websocket.receive_text(), timeout=30.0)
-                message_data = json.loads(data)
-                await voice_service.handle_message(message_data)
-            except asyncio.TimeoutError:
-                # Send keepalive
-                try:
-                    await websocket.send_text(json.dumps({
-                        "type": "keepalive",
-                        "timestamp": time.time()
-                    }))
-                except:
-                    break
-            except json.JSONDecodeError as e:
-                print(f"[API] JSON decode error: {e}")
-                continue
-            except WebSocketDisconnect:
-                print("[API] Voice WebSocket disconnected")
-                break
-            except Exception as e:
-                print(f"[API] Voice WebSocket error: {e}")
-                break
+        # Single pump per connection: wait for whichever comes first, an
+        # inbound frame or a queued outbound message. Dead peers are detected
+        # by uvicorn's ping/pong (ws_ping_interval)
+        outbox = voice_service.outbox
+        receive_task = asyncio.create_task(websocket.receive())
+        outbox_task = asyncio.create_task(outbox.get())
+        try:
+            while True:
+                done, _ = await asyncio.wait(
+                    {receive_task, outbox_task}, return_when=asyncio.FIRST_COMPLETED
+                )
+                
+                if outbox_task in done:
+                    # Flush anything queued meanwhile before re-arming the get()
+                    entry = outbox_task.result()
+                    while True:
+                        frame = voice_service.take_frame(entry)
+                        if frame is not None:
+                            await websocket.send_bytes(frame)
+                        if outbox.empty():
+                            break
+                        entry = outbox.get_nowait()
+                    outbox_task = asyncio.create_task(outbox.get())
+                
+                if receive_task in done:
+                    message = receive_task.result()
+                    if message["type"] == "websocket.disconnect":
+                        raise WebSocketDisconnect(message.get("code", 1000))
+                    
+                    if message.get("bytes") is not None:
+                        # Audio: raw bytes, no JSON envelope
+                        await voice_service.handle_audio_frame(message["bytes"])
+                    elif message.get("text") is not None:
+                        # Control messages (and legacy base64 audio_data)
+                        try:
+                            await voice_service.handle_message(loads(message["text"]))
+                        except json.JSONDecodeError as e:
+                            print(f"[API] JSON decode error: {e}")
+                    receive_task = asyncio.create_task(websocket.receive())
+        except WebSocketDisconnect:
+            print("[API] Voice WebSocket disconnected")
+        except Exception as e:
+            print(f"[API] Voice WebSocket error: {e}")
+        finally:
+            receive_task.cancel()
+            outbox_task.cancel()
                 
     except Exception as e:
         print(f"[API] Voice WebSocket error: {e}")
@@ -655,48 +893,26 @@ async def realtime_websocket_endpoint(websocket: WebSocket):
     try:
         print(f"[API] Realtime WebSocket connected: {connection_id}")
         
-        # Start keepalive task
-        keepalive_task = asyncio.create_task(keepalive_ping(websocket))
-        
         try:
             await realtime_service.start_realtime_conversation(websocket, connection_id)
         except Exception as e:
             print(f"[API] Realtime conversation error: {e}")
-            await websocket.send_text(json.dumps({
+            await websocket.send_bytes(dumps({
                 "type": "error",
                 "message": f"Realtime conversation failed: {str(e)}"
             }))
     except Exception as e:
         print(f"[API] Realtime WebSocket error: {e}")
     finally:
-        # Cancel keepalive task
-        if 'keepalive_task' in locals():
-            keepalive_task.cancel()
         realtime_service.stop_conversation(connection_id)
         print(f"[API] Realtime WebSocket disconnected: {connection_id}")
 
-async def keepalive_ping(websocket: WebSocket):
-    """Send periodic keepalive messages to keep WebSocket connection alive"""
-    try:
-        while True:
-            await asyncio.sleep(30)  # Send keepalive every 30 seconds
-            try:
-                # Send a keepalive message instead of ping (more compatible)
-                await websocket.send_text(json.dumps({
-                    "type": "keepalive",
-                    "timestamp": time.time()
-                }))
-                print("[API] Sent keepalive message to realtime WebSocket")
-            except Exception as e:
-                print(f"[API] Keepalive message failed: {e}")
-                break
-    except asyncio.CancelledError:
-        print("[API] Keepalive task cancelled")
-
 # Regular WebSocket endpoint for text-based conversation
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await manager.connect(websocket)
+    # Keys this client's memory in the background agent's checkpointer
+    conversation_id = manager.next_message_id("chat")
     try:
         # Send initial state
         await manager.send_agent_update(websocket)
@@ -704,33 +920,21 @@ async def websocket_endpoint(websocket: WebSocket):
         while True:
             try:
                 # Check if connection is still open
-                if websocket.client_state.name != "CONNECTED":
+                if websocket.client_state is not WebSocketState.CONNECTED:
                     print("[API] WebSocket connection closed, breaking loop")
                     break
                 
-                # Receive message from client with timeout
-                try:
-                    data = await asyncio.wait_for(websocket.receive_text(), timeout=30.0)
-                    message_data = json.loads(data)
-                except asyncio.TimeoutError:
-                    print("[API] WebSocket receive timeout, sending keepalive")
-                    # Send a keepalive message to check if connection is still alive
-                    try:
-                        await websocket.send_text(json.dumps({
-                            "type": "keepalive",
-                            "timestamp": time.time()
-                        }))
-                        continue
-                    except:
-                        print("[API] Keepalive failed, connection is dead")
-                        break
+                # Receive message from client; dead peers are detected by
+                # uvicorn's ping/pong (ws_ping_interval)
+                data = await websocket.receive_text()
+                message_data = loads(data)
                 
                 if message_data["type"] == "user_message":
                     user_message = message_data["content"]
                     
                     # Create user message
                     user_msg = Message(
-                        id=f"user_{int(time.time())}",
+                        id=manager.next_message_id("user"),
                         type="user",
                         content=user_message,
                         timestamp=datetime.now(),
@@ -748,7 +952,7 @@ async def websocket_endpoint(websocket: WebSocket):
                     
                     # Create AI message
                     ai_msg = Message(
-                        id=f"ai_{int(time.time())}",
+                        id=manager.next_message_id("ai"),
                         type="ai",
                         content=ai_response,
                         timestamp=datetime.now(),
@@ -762,7 +966,7 @@ async def websocket_endpoint(websocket: WebSocket):
                     await manager.send_message(ai_msg, websocket)
                     
                     # Trigger agent in the loop
-                    await manager.trigger_agent_in_loop(user_message, ai_response, websocket)
+                    await manager.trigger_agent_in_loop(user_message, ai_response, websocket, conversation_id)
                     
                 elif message_data["type"] == "get_status":
                     # Send current status
@@ -771,15 +975,11 @@ async def websocket_endpoint(websocket: WebSocket):
             except json.JSONDecodeError as e:
                 print(f"[API] JSON decode error: {e}")
                 continue
-            except WebSocketDisconnect:
+            except CONNECTION_CLOSED_ERRORS:
                 print("[API] WebSocket disconnected during message processing")
                 break
             except Exception as e:
                 print(f"[API] Error processing message: {e}")
-                # Check if it's a disconnect-related error
-                if "disconnect" in str(e).lower() or "closed" in str(e).lower():
-                    print("[API] Connection closed, breaking loop")
-                    break
                 continue
                 
     except WebSocketDisconnect:
@@ -801,10 +1001,8 @@ async def health_check():
 @app.get("/conversation/history")
 async def get_conversation_history():
     """Get conversation history"""
-    return {
-        "messages": [msg.dict() for msg in manager.conversation_history],
-        "total": len(manager.conversation_history)
-    }
+    # Messages are serialized once when added; polls reuse the cached body
+    return Response(manager.history_json(), media_type="application/json")
 
 @app.get("/agents/status")
 async def get_agent_status():
@@ -818,7 +1016,7 @@ async def get_agent_status():
 @app.post("/conversation/clear")
 async def clear_conversation():
     """Clear conversation history"""
-    manager.conversation_history.clear()
+    manager.clear_history()
     return {"message": "Conversation cleared"}
 
 @app.post("/agents/reset")
@@ -830,8 +1028,7 @@ async def reset_agents():
         status="idle"
     )
     
-    for agent in manager.sub_agents:
-        agent.status = "idle"
+    manager.reset_sub_agents()
     
     manager.active_tasks.clear()
     
@@ -856,10 +1053,22 @@ async def cleanup_tasks():
 # app.mount("/", StaticFiles(directory="../frontend/build", html=True), name="static")
 
 if __name__ == "__main__":
+    # DEV=1 for auto-reload and info/access logging; otherwise production
+    # settings (warnings only, no per-request access log)
+    dev = bool(os.getenv("DEV"))
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=8000,
-        reload=True,
-        log_level="info"
+        reload=dev,
+        log_level="info" if dev else "warning",
+        access_log=dev,
+        http="httptools",
+        ws_per_message_deflate=False,
+        # Protocol-level keepalive: ping every 20s, drop peers that miss the pong
+        ws_ping_interval=20,
+        ws_ping_timeout=20,
+        # libuv-backed event loop for every WebSocket endpoint (uvloop has no
+        # Windows build)
+        loop="asyncio" if sys.platform == "win32" else "uvloop"
     )
@@ -5,17 +5,90 @@ Handles speech-to-speech conversation with background agent integration.
 """
 
 import asyncio
-import base64
 import json
+import logging
 import time
-from typing import Dict, Any, Optional
+import uuid
+from collections import deque
+from binascii import a2b_base64, b2a_base64
+from dataclasses import dataclass
+from typing import Callable, Dict, Any, Optional
+from fastapi.websockets import WebSocketState
 from openai import AsyncOpenAI
 from dotenv import load_dotenv
 
-from audio_service import audio_service
+from audio_service import audio_service, BYTES_PER_CHUNK
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 load_dotenv()
 
+# Per-event and per-utterance messages are DEBUG; with the default WARNING
+# level they are neither formatted nor written
+logger = logging.getLogger(__name__)
+
+def _dumps(obj) -> bytes:
+    """JSON-encode a message (or a single string) to UTF-8 bytes for send_bytes"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode()
+
+# Mic chunks go to the model pre-serialized (conn.send_raw) instead of through
+# the SDK's stdlib json; base64 never needs escaping, so the event is built by
+# concatenation around the encoded audio
+AUDIO_APPEND_PREFIX = b'{"type":"input_audio_buffer.append","audio":"'
+AUDIO_APPEND_SUFFIX = b'"}'
+CANCEL_EVENT = '{"type":"response.cancel"}'
+
+# Transcript deltas differ only in their content, so the envelope around it
+# is encoded once and only the delta string is serialized per event
+AI_DELTA_PREFIX = b'{"type":"ai_transcript_delta","content":'
+USER_DELTA_PREFIX = b'{"type":"user_transcript_delta","content":'
+
+# Fixed messages, encoded once
+SPEECH_STARTED_MESSAGE = _dumps({"type": "user_speaking_started"})
+SPEECH_STOPPED_MESSAGE = _dumps({"type": "user_speaking_stopped"})
+AUDIO_UNAVAILABLE_MESSAGE = _dumps({
+    "type": "warning",
+    "message": "Audio service unavailable - using text-only mode"
+})
+
+# How long the sender waits after a transcript delta so the deltas that
+# follow it can be merged into the same frame
+DELTA_COALESCE_WINDOW = 0.01
+
+# The mic pump yields explicitly only once per this many chunks: waiting for
+# capture already suspends, this just bounds how long a backlog of buffered
+# chunks can hold the loop when the sends complete without suspending
+MIC_YIELD_EVERY = 16
+
+# Completed-analysis messages: fixed prefix plus the (truncated) analysis
+ANALYSIS_PREFIX = "🧠 Conversation analysis: "
+ANALYSIS_MAX_CHARS = 200
+
+def _coalesce(batch: list) -> list:
+    """Merge runs of same-type deltas ((prefix, text) tuples) in a send batch"""
+    merged = []
+    for item in batch:
+        if (isinstance(item, tuple) and merged and isinstance(merged[-1], tuple)
+                and merged[-1][0] is item[0]):
+            merged[-1] = (item[0], merged[-1][1] + item[1])
+        else:
+            merged.append(item)
+    return merged
+
+@dataclass
+class ConversationState:
+    """Mutable per-conversation state shared by the event handlers and the mic pump"""
+    post: Callable[[Any], None]
+    conn: Any = None
+    play_queue: Optional[asyncio.Queue] = None
+    response_active: bool = False
+    current_user_message: Optional[str] = None
+
 class RealtimeService:
     """Service for handling OpenAI Realtime API conversations"""
     
@@ -24,6 +97,21 @@ class RealtimeService:
         self.active_connections: Dict[str, Any] = {}
         self.background_manager = None
         self.frontend_websocket = None
+        # event.type -> handler(event, state), built once; one dict lookup per
+        # event instead of walking an if/elif chain of string compares
+        self._event_handlers = {
+            "response.output_audio.delta": self._on_audio_delta,
+            "response.output_audio_transcript.delta": self._on_ai_transcript_delta,
+            "response.output_audio_transcript.done": self._on_ai_transcript_done,
+            "conversation.item.input_audio_transcription.delta": self._on_user_transcript_delta,
+            "conversation.item.input_audio_transcription.completed": self._on_user_transcript_completed,
+            "input_audio_buffer.speech_started": self._on_speech_started,
+            "input_audio_buffer.speech_stopped": self._on_speech_stopped,
+            "response.done": self._on_response_done,
+            "response.started": self._on_response_started,
+            "response.error": self._on_response_error,
+            "error": self._on_error,
+        }
         
     async def start_realtime_conversation(self, websocket, connection_id: str):
         """Start a realtime conversation session"""
@@ -35,14 +123,11 @@ class RealtimeService:
             if not audio_service.is_initialized:
                 try:
                     audio_service.initialize()
-                    print("[RealtimeService] Audio service initialized successfully")
+                    logger.info("[RealtimeService] Audio service initialized successfully")
                 except Exception as e:
-                    print(f"[RealtimeService] Audio service initialization failed: {e}")
+                    logger.warning("[RealtimeService] Audio service initialization failed: %s", e)
                     # Continue without audio service - frontend can still use text mode
-                    await self._send_to_frontend(websocket, {
-                        "type": "warning",
-                        "message": "Audio service unavailable - using text-only mode"
-                    })
+                    await self._send_bytes(websocket, AUDIO_UNAVAILABLE_MESSAGE)
             
             # Initialize background task manager
             self.background_manager = EnhancedBackgroundTaskManager()
@@ -88,158 +173,255 @@ class RealtimeService:
                 await self._run_audio_streaming(conn, websocket, connection_id)
                 
         except Exception as e:
-            print(f"[RealtimeService] Error in conversation: {e}")
+            logger.error("[RealtimeService] Error in conversation: %s", e)
             await self._send_error_to_frontend(websocket, str(e))
         finally:
             # Clean up connection
             if connection_id in self.active_connections:
                 del self.active_connections[connection_id]
+            if self.background_manager:
+                self.background_manager.close()
+            # Keep the audio streams open for the next connection, just drop
+            # whatever this one left buffered
+            audio_service.reset()
     
     async def _run_audio_streaming(self, conn, websocket, connection_id: str):
         """Run the audio streaming tasks"""
-        response_active = False
-        current_user_message = None
+        # Set when either pump ends or stop_conversation() is called; the mic
+        # pump checks it instead of looking the connection up per chunk
+        stop_evt = asyncio.Event()
+        self.active_connections[connection_id]["stop"] = stop_evt
+        
+        # Everything the event handlers send goes through one queue drained
+        # by a single sender, which keeps order and merges transcript deltas
+        outbox: asyncio.Queue = asyncio.Queue()
+        sender = asyncio.create_task(self._sender_loop(websocket, outbox))
+        state = ConversationState(post=outbox.put_nowait, conn=conn)
+        
+        # Response audio is played by a worker in the default executor, so a
+        # full speaker ring (play_bytes waits for space) never blocks the loop
+        speaker = audio_service.speaker if audio_service.is_initialized else None
+        player = None
+        if speaker:
+            # Unbounded: a reply arrives faster than real time, so the queue
+            # holds the rest of the response (a few MB at most) while the
+            # speaker plays it. Audio is only dropped on barge-in or session end
+            state.play_queue = asyncio.Queue()
+            player = asyncio.create_task(self._play_worker(speaker, state.play_queue))
         
         # Task A: Send microphone audio to OpenAI
         async def pump_mic():
-            while connection_id in self.active_connections:
+            # One capture buffer for the whole conversation, refilled per chunk
+            pcm = bytearray(BYTES_PER_CHUNK)
+            chunks = 0
+            while not stop_evt.is_set():
                 try:
                     # Check if audio service is available
                     if not audio_service.is_initialized or not audio_service.microphone:
-                        print("[RealtimeService] Audio service not available, skipping mic pump")
+                        logger.warning("[RealtimeService] Audio service not available, skipping mic pump")
                         await asyncio.sleep(1)
                         continue
                     
-                    pcm = audio_service.microphone.read_chunk()
-                    # Cancel any active response when new audio comes in
-                    if response_active:
-                        try:
-                            await conn.send({"type": "response.cancel"})
-                        except Exception as e:
-                            print(f"[RealtimeService] Cancel error: {e}")
+                    mic = audio_service.microphone
+                    if mic.has_chunk():
+                        mic.read_chunk_into(pcm)
+                    else:
+                        # The next block is still being captured: wait for it
+                        # in a worker thread, not on the event loop
+                        await asyncio.to_thread(mic.read_chunk_into, pcm)
                     
-                    await conn.input_audio_buffer.append(
-                        audio=base64.b64encode(pcm).decode("utf-8")
+                    # binascii directly: no base64-module wrapper, no newline
+                    await conn.send_raw(
+                        (AUDIO_APPEND_PREFIX + b2a_base64(pcm, newline=False) + AUDIO_APPEND_SUFFIX).decode("ascii")
                     )
-                    await asyncio.sleep(0)  # yield to event loop
+                    chunks += 1
+                    if chunks % MIC_YIELD_EVERY == 0:
+                        await asyncio.sleep(0)  # yield to event loop
                 except Exception as e:
-                    print(f"[RealtimeService] Mic pump error: {e}")
+                    logger.warning("[RealtimeService] Mic pump error: %s", e)
                     # Don't break immediately, try to continue
                     await asyncio.sleep(0.1)
                     continue
         
         # Task B: Handle OpenAI responses and play audio
         async def pump_model():
-            nonlocal response_active, current_user_message
+            handlers = self._event_handlers
             async for event in conn:
                 try:
-                    t = event.type
-                    
-                    if t == "response.output_audio.delta":
-                        # Play audio through speaker (with error handling)
-                        try:
-                            pcm_bytes = base64.b64decode(event.delta)
-                            if audio_service.is_initialized and audio_service.speaker:
-                                audio_service.speaker.play_bytes(pcm_bytes)
-                        except Exception as e:
-                            print(f"[RealtimeService] Audio playback error: {e}")
-                            # Continue processing even if audio playback fails
-                        
-                    elif t == "response.output_audio_transcript.delta":
-                        # Send live transcript to frontend
-                        await self._send_to_frontend(websocket, {
-                            "type": "ai_transcript_delta",
-                            "content": event.delta
-                        })
-                        
-                    elif t == "response.output_audio_transcript.done":
-                        # AI response complete
-                        ai_transcript = getattr(event, 'transcript', '')
-                        if ai_transcript:
-                            # Send AI message to frontend
-                            await self._send_to_frontend(websocket, {
-                                "type": "ai_response_complete",
-                                "content": ai_transcript
-                            })
-                            print(f"[RealtimeService] AI said: {ai_transcript}")
-                            
-                            # Trigger background agent
-                            if current_user_message:
-                                await self.background_manager.on_conversation_turn_complete(
-                                    current_user_message, ai_transcript
-                                )
-                                current_user_message = None
-                        
-                    elif t == "conversation.item.input_audio_transcription.delta":
-                        # Send user transcript delta to frontend
-                        await self._send_to_frontend(websocket, {
-                            "type": "user_transcript_delta",
-                            "content": event.delta
-                        })
-                        
-                    elif t == "conversation.item.input_audio_transcription.completed":
-                        # User message complete
-                        user_message = event.transcript
-                        current_user_message = user_message
-                        # Send user message to frontend
-                        await self._send_to_frontend(websocket, {
-                            "type": "user_message_complete",
-                            "content": user_message
-                        })
-                        print(f"[RealtimeService] User said: {user_message}")
-                        
-                    elif t == "input_audio_buffer.speech_started":
-                        await self._send_to_frontend(websocket, {
-                            "type": "user_speaking_started"
-                        })
-                        self.background_manager.set_user_speaking(True)
-                        
-                    elif t == "input_audio_buffer.speech_stopped":
-                        await self._send_to_frontend(websocket, {
-                            "type": "user_speaking_stopped"
-                        })
-                        self.background_manager.set_user_speaking(False)
-                        
-                    elif t == "response.done":
-                        response_active = False
-                        self.background_manager.response_in_progress = False
-                        
-                    elif t == "response.started":
-                        response_active = True
-                        self.background_manager.response_in_progress = True
-                        
-                    elif t == "response.error":
-                        error_msg = getattr(event, 'error', event)
-                        await self._send_error_to_frontend(websocket, f"Response error: {error_msg}")
-                        response_active = False
-                        
-                    elif t == "error":
-                        error = getattr(event, 'error', event)
-                        error_msg = f"Connection error: {getattr(error, 'message', str(error))}"
-                        await self._send_error_to_frontend(websocket, error_msg)
-                        response_active = False
-                        
+                    handler = handlers.get(event.type)
+                    if handler:
+                        await handler(event, state)
                 except Exception as e:
-                    print(f"[RealtimeService] Event handling error: {e}")
+                    logger.error("[RealtimeService] Event handling error: %s", e)
                     break
         
+        async def run_model():
+            # Once the model stream ends there is nothing left to pump audio to
+            try:
+                await pump_model()
+            finally:
+                stop_evt.set()
+        
         # Run both tasks concurrently
-        await asyncio.gather(pump_mic(), pump_model())
+        try:
+            await asyncio.gather(pump_mic(), run_model())
+        finally:
+            stop_evt.set()
+            sender.cancel()
+            if player:
+                player.cancel()
+                speaker.flush()
+    
+    # ---- OpenAI event handlers (see _event_handlers) ----
+    
+    async def _on_audio_delta(self, event, state: ConversationState):
+        # Queue audio for the speaker worker (with error handling)
+        play_queue = state.play_queue
+        if play_queue is None:
+            return
+        try:
+            play_queue.put_nowait(a2b_base64(event.delta))
+        except Exception as e:
+            logger.warning("[RealtimeService] Audio playback error: %s", e)
+            # Continue processing even if audio playback fails
+    
+    async def _on_ai_transcript_delta(self, event, state: ConversationState):
+        # Send live transcript to frontend
+        state.post((AI_DELTA_PREFIX, event.delta))
+    
+    async def _on_ai_transcript_done(self, event, state: ConversationState):
+        # AI response complete
+        ai_transcript = getattr(event, 'transcript', '')
+        if ai_transcript:
+            # Send AI message to frontend
+            state.post({
+                "type": "ai_response_complete",
+                "content": ai_transcript
+            })
+            logger.debug("[RealtimeService] AI said: %s", ai_transcript)
+            
+            # Trigger background agent
+            if state.current_user_message:
+                await self.background_manager.on_conversation_turn_complete(
+                    state.current_user_message, ai_transcript
+                )
+                state.current_user_message = None
+    
+    async def _on_user_transcript_delta(self, event, state: ConversationState):
+        # Send user transcript delta to frontend
+        state.post((USER_DELTA_PREFIX, event.delta))
+    
+    async def _on_user_transcript_completed(self, event, state: ConversationState):
+        # User message complete
+        user_message = event.transcript
+        state.current_user_message = user_message
+        # Send user message to frontend
+        state.post({
+            "type": "user_message_complete",
+            "content": user_message
+        })
+        logger.debug("[RealtimeService] User said: %s", user_message)
+    
+    async def _on_speech_started(self, event, state: ConversationState):
+        # Barge-in: server VAD reports it once, so the active response is
+        # cancelled once here rather than on every mic chunk
+        if state.response_active:
+            state.response_active = False
+            try:
+                await state.conn.send_raw(CANCEL_EVENT)
+            except Exception as e:
+                logger.warning("[RealtimeService] Cancel error: %s", e)
+            # Drop the reply audio not played yet, queued and in the device ring
+            play_queue = state.play_queue
+            if play_queue is not None:
+                while True:
+                    try:
+                        play_queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        break
+                if audio_service.speaker:
+                    audio_service.speaker.flush()
+        state.post(SPEECH_STARTED_MESSAGE)
+        self.background_manager.set_user_speaking(True)
+    
+    async def _on_speech_stopped(self, event, state: ConversationState):
+        state.post(SPEECH_STOPPED_MESSAGE)
+        self.background_manager.set_user_speaking(False)
+    
+    async def _on_response_done(self, event, state: ConversationState):
+        state.response_active = False
+        self.background_manager.response_in_progress = False
+    
+    async def _on_response_started(self, event, state: ConversationState):
+        state.response_active = True
+        self.background_manager.response_in_progress = True
+    
+    async def _on_response_error(self, event, state: ConversationState):
+        # Not a typed SDK event, so the payload shape is not guaranteed
+        error_msg = getattr(event, 'error', event)
+        state.post({"type": "error", "message": f"Response error: {error_msg}"})
+        state.response_active = False
+    
+    async def _on_error(self, event, state: ConversationState):
+        error = getattr(event, 'error', event)
+        error_msg = f"Connection error: {getattr(error, 'message', str(error))}"
+        state.post({"type": "error", "message": error_msg})
+        state.response_active = False
+    
+    async def _play_worker(self, speaker, play_queue: asyncio.Queue):
+        """Feed queued response audio to the speaker from the default executor"""
+        loop = asyncio.get_running_loop()
+        while True:
+            pcm_bytes = await play_queue.get()
+            try:
+                await loop.run_in_executor(None, speaker.play_bytes, pcm_bytes)
+            except Exception as e:
+                logger.warning("[RealtimeService] Audio playback error: %s", e)
+    
+    async def _sender_loop(self, websocket, outbox: asyncio.Queue):
+        """Send queued messages in order, merging runs of transcript deltas"""
+        while True:
+            batch = [await outbox.get()]
+            if isinstance(batch[0], tuple):
+                # Give the rest of the token burst a moment to arrive
+                await asyncio.sleep(DELTA_COALESCE_WINDOW)
+            while True:
+                try:
+                    batch.append(outbox.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+            
+            for item in _coalesce(batch):
+                if isinstance(item, tuple):
+                    await self._send_delta(websocket, *item)
+                elif isinstance(item, bytes):
+                    await self._send_bytes(websocket, item)
+                else:
+                    await self._send_to_frontend(websocket, item)
     
     async def _send_to_frontend(self, websocket, data: Dict[str, Any]):
         """Send data to frontend via WebSocket"""
+        # Binary frame of orjson bytes: no str round-trip, the frontend
+        # decodes binary frames before parsing
+        return await self._send_bytes(websocket, _dumps(data))
+    
+    async def _send_bytes(self, websocket, payload: bytes):
+        """Send an already-encoded JSON message to frontend"""
         try:
-            # Check if connection is still open before sending
-            if websocket.client_state.name != "CONNECTED":
-                print("[RealtimeService] Connection closed, not sending message")
+            if websocket.client_state is not WebSocketState.CONNECTED:
+                logger.debug("[RealtimeService] Connection closed, not sending message")
                 return False
             
-            await websocket.send_text(json.dumps(data))
+            await websocket.send_bytes(payload)
             return True
         except Exception as e:
-            print(f"[RealtimeService] Error sending to frontend: {e}")
+            logger.warning("[RealtimeService] Error sending to frontend: %s", e)
             return False
     
+    async def _send_delta(self, websocket, prefix: bytes, delta: str):
+        """Send a transcript delta using a pre-encoded envelope prefix"""
+        return await self._send_bytes(websocket, prefix + _dumps(delta) + b"}")
+    
     async def _send_error_to_frontend(self, websocket, error_msg: str):
         """Send error message to frontend"""
         await self._send_to_frontend(websocket, {
@@ -249,19 +431,37 @@ class RealtimeService:
     
     def stop_conversation(self, connection_id: str):
         """Stop a conversation session"""
-        if connection_id in self.active_connections:
-            del self.active_connections[connection_id]
+        connection = self.active_connections.pop(connection_id, None)
+        if connection and "stop" in connection:
+            connection["stop"].set()
+
+# Bounds for the background manager's per-session state: undelivered results
+# kept (oldest dropped), conversation turns kept, and how long a delivered
+# task stays in active_tasks
+PENDING_RESULTS_MAX = 64
+HISTORY_MAX_TURNS = 100
+TASK_RETENTION_SECONDS = 300
 
 # Enhanced Background Task Manager (adapted from test_bidirectional.py)
 class EnhancedBackgroundTaskManager:
     def __init__(self):
         self.active_tasks = {}
-        self.conversation_history = []
+        self.conversation_history = deque(maxlen=HISTORY_MAX_TURNS)
         self.connection = None
         self.task_counter = 0
-        self.pending_results = []
+        self.pending_results = deque(maxlen=PENDING_RESULTS_MAX)
         self.user_speaking = False
         self.response_in_progress = False
+        # (task_id, user_message, ai_response) jobs run one at a time by a
+        # single worker task, started on the first turn
+        self._jobs: asyncio.Queue = asyncio.Queue()
+        self._worker: Optional[asyncio.Task] = None
+    
+    def close(self):
+        """Stop the job worker (queued jobs are dropped)"""
+        if self._worker:
+            self._worker.cancel()
+            self._worker = None
     
     def set_connection(self, connection):
         """Set the realtime connection for out-of-band responses"""
@@ -270,15 +470,15 @@ class EnhancedBackgroundTaskManager:
     def set_user_speaking(self, speaking: bool):
         """Track whether user is currently speaking"""
         self.user_speaking = speaking
-        print(f"[Background] User speaking state changed to: {speaking}")
+        logger.debug("[Background] User speaking state changed to: %s", speaking)
         if not speaking:
             # User finished speaking, deliver any pending results
-            print(f"[Background] User finished speaking, checking for pending results...")
+            logger.debug("[Background] User finished speaking, checking for pending results...")
             # Only deliver if we have a valid connection
-            if realtime_service.frontend_websocket and realtime_service.frontend_websocket.client_state.name == "CONNECTED":
+            if realtime_service.frontend_websocket and realtime_service.frontend_websocket.client_state is WebSocketState.CONNECTED:
                 asyncio.create_task(self._deliver_pending_results())
             else:
-                print("[Background] No valid connection, clearing pending results")
+                logger.debug("[Background] No valid connection, clearing pending results")
                 self.pending_results.clear()
     
     async def on_conversation_turn_complete(self, user_message: str, ai_response: str):
@@ -290,31 +490,43 @@ class EnhancedBackgroundTaskManager:
             "timestamp": time.time()
         }
         self.conversation_history.append(turn)
+        self._prune_tasks()
         
-        # Create background task using our own system
-        task_id = self._create_background_task(user_message, ai_response)
-        
+        # Queue the analysis job for the worker
+        task_id = f"task_{uuid.uuid4().hex[:8]}"
         self.active_tasks[task_id] = {
             "created_at": time.time(),
             "user_message": user_message,
             "ai_response": ai_response,
             "delivered": False
         }
+        self._jobs.put_nowait((task_id, user_message, ai_response))
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._job_worker())
         
-        print(f"[Background] Created task {task_id} for: {user_message[:50]}...")
-        
-        # Start monitoring this task
-        asyncio.create_task(self._monitor_task(task_id))
+        logger.debug("[Background] Created task %s for: %s...", task_id, user_message[:50])
     
-    def _create_background_task(self, user_message: str, ai_response: str) -> str:
-        """Create a background task for conversation analysis"""
-        import uuid
-        task_id = f"task_{uuid.uuid4().hex[:8]}"
-        
-        # Start the background task
-        asyncio.create_task(self._run_background_task(task_id, user_message, ai_response))
-        
-        return task_id
+    def _prune_tasks(self):
+        """Drop delivered tasks older than TASK_RETENTION_SECONDS"""
+        cutoff = time.time() - TASK_RETENTION_SECONDS
+        self.active_tasks = {
+            task_id: task for task_id, task in self.active_tasks.items()
+            if not (task["delivered"] and task["created_at"] < cutoff)
+        }
+    
+    async def _job_worker(self):
+        """Run queued analysis jobs in order and buffer each result"""
+        while True:
+            task_id, user_message, ai_response = await self._jobs.get()
+            await self._run_background_task(task_id, user_message, ai_response)
+            
+            task = self.active_tasks.get(task_id)
+            if task is None:
+                continue
+            if task.get('status') == 'completed':
+                await self._buffer_result(task_id, task['result'])
+            elif task.get('status') == 'error':
+                await self._buffer_error(task_id, task['error'])
     
     async def _run_background_task(self, task_id: str, user_message: str, ai_response: str):
         """Run the background task for conversation analysis"""
@@ -344,20 +556,6 @@ class EnhancedBackgroundTaskManager:
                 self.active_tasks[task_id]["error"] = str(e)
                 self.active_tasks[task_id]["delivered"] = False
     
-    async def _monitor_task(self, task_id: str):
-        """Monitor a specific task and deliver result when ready"""
-        while task_id in self.active_tasks:
-            task = self.active_tasks[task_id]
-            
-            if task.get('status') == 'completed':
-                await self._buffer_result(task_id, task['result'])
-                break
-            elif task.get('status') == 'error':
-                await self._buffer_error(task_id, task['error'])
-                break
-            
-            await asyncio.sleep(0.5)  # Check every 500ms
-    
     async def _buffer_result(self, task_id: str, result: dict):
         """Buffer a completed result instead of delivering immediately"""
         completion_message = self._create_completion_message(task_id, result)
@@ -368,7 +566,7 @@ class EnhancedBackgroundTaskManager:
         }
         self.pending_results.append(buffered_item)
         self.active_tasks[task_id]["delivered"] = True
-        print(f"[Background] Buffered result for task {task_id}")
+        logger.debug("[Background] Buffered result for task %s", task_id)
     
     async def _buffer_error(self, task_id: str, error: str):
         """Buffer an error result instead of delivering immediately"""
@@ -380,27 +578,27 @@ class EnhancedBackgroundTaskManager:
         }
         self.pending_results.append(buffered_item)
         self.active_tasks[task_id]["delivered"] = True
-        print(f"[Background] Buffered error for task {task_id}")
+        logger.debug("[Background] Buffered error for task %s", task_id)
     
     async def _deliver_pending_results(self):
         """Deliver all pending results when user finishes speaking"""
         if not self.pending_results or self.response_in_progress:
             return
         
-        print(f"[Background] Delivering {len(self.pending_results)} pending results")
+        logger.debug("[Background] Delivering %s pending results", len(self.pending_results))
         
         # Combine all pending results into a single message
         if len(self.pending_results) == 1:
             combined_message = self.pending_results[0]["message"]
         else:
-            combined_message = "Here are the results from the background tasks:\n" + "\n".join([f"• {result['message']}" for result in self.pending_results])
+            combined_message = "Here are the results from the background tasks:\n" + "\n".join(f"• {result['message']}" for result in self.pending_results)
         
-        print(f"[Background] Combined message to deliver: {combined_message}")
+        logger.debug("[Background] Combined message to deliver: %s", combined_message)
         
         try:
             # Check if connection is still alive
-            if not realtime_service.frontend_websocket or realtime_service.frontend_websocket.client_state.name != "CONNECTED":
-                print("[Background] Connection is dead, not delivering pending results")
+            if not realtime_service.frontend_websocket or realtime_service.frontend_websocket.client_state is not WebSocketState.CONNECTED:
+                logger.info("[Background] Connection is dead, not delivering pending results")
                 self.pending_results.clear()
                 return
             
@@ -411,14 +609,14 @@ class EnhancedBackgroundTaskManager:
                     "content": combined_message
                 })
                 if success:
-                    print(f"[Background] Successfully sent {len(self.pending_results)} buffered results to frontend")
+                    logger.debug("[Background] Successfully sent %s buffered results to frontend", len(self.pending_results))
                 else:
-                    print("[Background] Failed to send results - connection may be closed")
+                    logger.warning("[Background] Failed to send results - connection may be closed")
             else:
-                print("[Background] No frontend websocket available")
+                logger.info("[Background] No frontend websocket available")
             
         except Exception as e:
-            print(f"[Background] Failed to deliver buffered results: {e}")
+            logger.warning("[Background] Failed to deliver buffered results: %s", e)
         
         # Clear the pending results
         self.pending_results.clear()
@@ -427,9 +625,9 @@ class EnhancedBackgroundTaskManager:
         """Create a completion message for the background task result"""
         message = result.get('message', 'Conversation insights gathered')
         # Truncate very long analysis messages
-        if len(message) > 200:
-            message = message[:200] + "..."
-        return f"🧠 Conversation analysis: {message}"
+        if len(message) > ANALYSIS_MAX_CHARS:
+            message = message[:ANALYSIS_MAX_CHARS] + "..."
+        return ANALYSIS_PREFIX + message
 
 # Global realtime service instance
 realtime_service = RealtimeService()
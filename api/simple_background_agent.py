@@ -5,22 +5,64 @@ Stores task results in memory for polling by the main application.
 """
 
 import asyncio
+import atexit
 import json
+import logging
+import logging.handlers
+import os
+import queue
 import random
-import time
-from typing import Dict, Any
-from dataclasses import dataclass, asdict
+import sys
 import threading
+import time
+from typing import Dict, Any, List, Optional, Set, Tuple
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+from itertools import count
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
 from langgraph.prebuilt import create_react_agent
 from langgraph.checkpoint.memory import InMemorySaver
-from openai import OpenAI
+from langchain_openai import ChatOpenAI
+from openai import OpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient
 from dotenv import load_dotenv
 
+# HTTP/2 needs the optional h2 package (httpx[http2])
+try:
+    import h2  # noqa: F401
+    HTTP2 = True
+except ImportError:
+    HTTP2 = False
+
 load_dotenv()
 
-@dataclass
+# Warm worker threads for agent runs started outside an event loop; bounds
+# how many blocking OpenAI calls are in flight at once (further tasks wait in
+# the executor's queue)
+_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.getenv("BG_WORKERS", "8")),
+    thread_name_prefix="bg-agent"
+)
+atexit.register(_EXECUTOR.shutdown, wait=False)
+
+# Worker threads only put records on a queue; a listener thread does the
+# stderr writes, so no task blocks on the stream lock
+logger = logging.getLogger(__name__)
+logger.setLevel(os.getenv("BG_LOG_LEVEL", "INFO"))
+logger.propagate = False
+_log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+_log_listener = logging.handlers.QueueListener(_log_queue, logging.StreamHandler())
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
+# Slotted instances (no per-task __dict__) where dataclasses support it
+_DATACLASS_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+# Immutable: status changes swap a new snapshot into the tasks dict, so
+# readers never see a half-updated task and no lock is needed
+@dataclass(frozen=True, **_DATACLASS_SLOTS)
 class TaskResult:
     task_id: str
     status: str  # "pending", "running", "completed", "error"
@@ -29,15 +71,54 @@ class TaskResult:
     created_at: float = 0.0
     completed_at: float = 0.0
     message: str = ""
+    # Plain-dict form for status polls, built once per snapshot (instances
+    # never change, so it cannot go stale); shared, callers must not mutate it
+    _cached_dict: Dict[str, Any] = field(default=None, init=False, repr=False, compare=False)
+    
+    def __post_init__(self):
+        object.__setattr__(self, "_cached_dict", {
+            "task_id": self.task_id,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "completed_at": self.completed_at,
+            "message": self.message,
+        })
+
+# Checkpointer thread used when the caller does not name a conversation
+DEFAULT_CONVERSATION_ID = "conversation_analysis"
+
+# Oldest tasks are evicted once this many are tracked
+TASKS_MAX = 10_000
+
+# Turns that are already queued when the batching worker picks one up (up to
+# TURN_BATCH_MAX) are analyzed together in one agent call per conversation;
+# a lone turn is dispatched immediately
+TURN_BATCH_MAX = 8
 
 # ---- Background Agent Tools ----
 # No tools needed - just conversation analysis
 
 class ReActBackgroundAgent:
     def __init__(self):
-        self.tasks: Dict[str, TaskResult] = {}
-        self.task_counter = 0
-        self.lock = threading.Lock()
+        # Single dict operations (get/set/pop/copy) are atomic under the GIL,
+        # which is all the sharing between worker threads and the loop needs.
+        # Insertion order is creation order (workers only replace existing
+        # keys), so the oldest task is always first
+        self.tasks: Dict[str, TaskResult] = OrderedDict()
+        self._next_task_number = count(1).__next__
+        # task_id -> (loop, event) for async watchers; set from worker threads
+        self.task_events: Dict[str, Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = {}
+        # task_id -> event set once the task reaches completed/error
+        self.done_events: Dict[str, threading.Event] = {}
+        # Strong references to in-flight asyncio runs (the loop only keeps weak ones)
+        self._async_runs: Set[asyncio.Task] = set()
+        # conversation_id -> messages in its checkpointed thread, as of the last run
+        self._history_len: Dict[str, int] = {}
+        # Turns waiting for the batching worker (created on the server's loop)
+        self._turn_queue: Optional[asyncio.Queue] = None
+        self._turn_worker: Optional[asyncio.Task] = None
         
         # Create checkpointer for conversation memory
         self.checkpointer = InMemorySaver()
@@ -59,86 +140,248 @@ You have access to the full conversation history through your memory. Use this c
 
 Provide thoughtful, constructive feedback that helps improve the conversation experience."""
         
+        model = ChatOpenAI(
+            model="gpt-4o-mini",
+            # One connection pool per client for all agent runs, for
+            # invoke() from worker threads and ainvoke() on the loop: TLS
+            # is set up once and, over HTTP/2, concurrent runs multiplex
+            # on one connection. The SDK defaults (timeouts, limits) stay
+            http_client=DefaultHttpxClient(http2=HTTP2),
+            http_async_client=DefaultAsyncHttpxClient(http2=HTTP2)
+        )
         self.agent = create_react_agent(
-            model="openai:gpt-4o-mini",
+            model=model,
             tools=[],  # No tools - just analysis
             name="background_agent",
             checkpointer=self.checkpointer,
             prompt=system_prompt
         )
-        
-        # Configuration for the agent (thread_id for conversation memory)
-        self.config = {"configurable": {"thread_id": "conversation_analysis"}}
+        # Same agent without memory for batched runs: the combined prompt is
+        # not written to any thread, only the individual turns are (see
+        # _run_turns_async)
+        self._batch_agent = create_react_agent(
+            model=model,
+            tools=[],
+            name="background_agent",
+            prompt=system_prompt
+        )
     
-    def create_task(self, user_message: str, ai_response: str, conversation_context: list = None) -> str:
+    def _config_for(self, conversation_id: str) -> Dict[str, Any]:
+        """Agent config for a conversation; the checkpointer keys memory on thread_id,
+        so each conversation gets its own history from the one shared agent"""
+        return {"configurable": {"thread_id": conversation_id}}
+    
+    def create_task(self, user_message: str, ai_response: str, conversation_context: list = None,
+                    conversation_id: str = DEFAULT_CONVERSATION_ID) -> str:
         """Create a new background task and return task ID"""
-        with self.lock:
-            self.task_counter += 1
-            task_id = f"task_{self.task_counter}_{int(time.time())}"
-            
-            task = TaskResult(
-                task_id=task_id,
-                status="pending",
-                created_at=time.time(),
-                message=f"Processing: {user_message[:50]}..."
-            )
-            
-            self.tasks[task_id] = task
-            
-            # Start background task in thread
-            thread = threading.Thread(
-                target=self._run_background_task,
-                args=(task_id, user_message, ai_response, conversation_context),
-                daemon=True
-            )
-            thread.start()
-            
-            print(f"[Background Agent] Created task {task_id}")
-            return task_id
+        task_id = f"task_{self._next_task_number()}_{int(time.time())}"
+        
+        task = TaskResult(
+            task_id=task_id,
+            status="pending",
+            created_at=time.time(),
+            message=f"Processing: {user_message[:50]}..."
+        )
+        
+        self.done_events[task_id] = threading.Event()
+        self.tasks[task_id] = task
+        while len(self.tasks) > TASKS_MAX:
+            evicted, _ = self.tasks.popitem(last=False)
+            self.done_events.pop(evicted, None)
+        
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        
+        if loop is not None:
+            # Called from the server: queue for the batching worker on its
+            # loop, the OpenAI call multiplexes with everything else there
+            self._queue_turn(loop, (task_id, user_message, ai_response, conversation_context, conversation_id))
+        else:
+            # No loop (scripts): blocking run on the worker pool
+            _EXECUTOR.submit(self._run_background_task, task_id, user_message, ai_response, conversation_context, conversation_id)
+        
+        logger.info("[Background Agent] Created task %s", task_id)
+        return task_id
     
-    def _run_background_task(self, task_id: str, user_message: str, ai_response: str, conversation_context: list):
-        """Run the actual background task using ReAct agent"""
+    def _run_background_task(self, task_id: str, user_message: str, ai_response: str, conversation_context: list, conversation_id: str):
+        """Run the actual background task using ReAct agent (worker thread)"""
         try:
-            with self.lock:
-                if task_id in self.tasks:
-                    self.tasks[task_id].status = "running"
-                    self.tasks[task_id].message = "Task is running..."
+            agent_input = self._start_run(task_id, user_message, ai_response, conversation_context)
             
-            print(f"[Background Agent] Task {task_id} starting ReAct processing")
+            # Run the ReAct agent with checkpointer to maintain conversation memory
+            response = self.agent.invoke(agent_input, config=self._config_for(conversation_id))
             
-            # Create context for the ReAct agent
-            context = self._create_agent_context(user_message, ai_response, conversation_context)
+            self._finish_run(task_id, response, user_message, conversation_id)
+        except Exception as e:
+            self._fail_run(task_id, e)
+    
+    async def _run_background_task_async(self, task_id: str, user_message: str, ai_response: str, conversation_context: list, conversation_id: str):
+        """Run the actual background task using ReAct agent (event loop)"""
+        try:
+            agent_input = self._start_run(task_id, user_message, ai_response, conversation_context)
             
             # Run the ReAct agent with checkpointer to maintain conversation memory
-            response = self.agent.invoke(
-                {"messages": [{"role": "user", "content": context}]},
-                config=self.config
-            )
+            response = await self.agent.ainvoke(agent_input, config=self._config_for(conversation_id))
             
-            # Extract the final result
-            final_message = response["messages"][-1].content
+            self._finish_run(task_id, response, user_message, conversation_id)
+        except Exception as e:
+            self._fail_run(task_id, e)
+    
+    def _queue_turn(self, loop: asyncio.AbstractEventLoop, turn: tuple):
+        """Hand a turn to the batching worker, starting it on first use"""
+        if self._turn_worker is None or self._turn_worker.done():
+            self._turn_queue = asyncio.Queue()
+            self._turn_worker = loop.create_task(self._batch_turns())
+        self._turn_queue.put_nowait(turn)
+    
+    async def _batch_turns(self):
+        """Collect queued turns into batches and start one agent run per conversation"""
+        queue = self._turn_queue
+        loop = asyncio.get_running_loop()
+        while True:
+            # No waiting for more turns: only what is already queued joins
+            batch = [await queue.get()]
+            while len(batch) < TURN_BATCH_MAX and not queue.empty():
+                batch.append(queue.get_nowait())
             
-            # Parse the result to extract structured data
-            result = self._parse_agent_result(final_message, user_message)
+            by_conversation: Dict[str, List[tuple]] = {}
+            for turn in batch:
+                by_conversation.setdefault(turn[4], []).append(turn)
+            for conversation_id, turns in by_conversation.items():
+                run = loop.create_task(self._run_turns_async(conversation_id, turns))
+                self._async_runs.add(run)
+                run.add_done_callback(self._async_runs.discard)
+    
+    async def _run_turns_async(self, conversation_id: str, turns: List[tuple]):
+        """Analyze several turns of one conversation with a single agent call"""
+        if len(turns) == 1:
+            await self._run_background_task_async(*turns[0])
+            return
+        
+        try:
+            for task_id, *_ in turns:
+                self._update(task_id, status="running", message="Task is running...")
+            logger.info("[Background Agent] Analyzing %d turns of %s in one run", len(turns), conversation_id)
             
-            with self.lock:
-                if task_id in self.tasks:
-                    self.tasks[task_id].status = "completed"
-                    self.tasks[task_id].result = result
-                    self.tasks[task_id].completed_at = time.time()
-                    self.tasks[task_id].message = "Task completed successfully"
+            # The memoryless agent sees the conversation's history plus the
+            # combined prompt, so nothing batch-specific reaches the thread
+            config = self._config_for(conversation_id)
+            state = await self.agent.aget_state(config)
+            history = state.values.get("messages", [])
+            agent_input = {"messages": [*history, {"role": "user", "content": self._create_batch_context(turns)}]}
+            response = await self._batch_agent.ainvoke(agent_input)
+            analyses = self._split_batch_result(response["messages"][-1].content, len(turns))
             
-            print(f"[Background Agent] Task {task_id} completed")
+            # Record each turn in the thread as a single-turn run would have
+            turn_messages = []
+            for (_, user_message, ai_response, conversation_context, _), analysis in zip(turns, analyses):
+                turn_messages.append({"role": "user", "content": self._create_agent_context(user_message, ai_response, conversation_context)})
+                turn_messages.append({"role": "assistant", "content": analysis})
+            await self.agent.aupdate_state(config, {"messages": turn_messages}, as_node="agent")
+            self._history_len[conversation_id] = len(history) + len(turn_messages)
             
+            for (task_id, user_message, *_), analysis in zip(turns, analyses):
+                self._complete_run(task_id, analysis, user_message)
         except Exception as e:
-            with self.lock:
-                if task_id in self.tasks:
-                    self.tasks[task_id].status = "error"
-                    self.tasks[task_id].error = str(e)
-                    self.tasks[task_id].completed_at = time.time()
-                    self.tasks[task_id].message = f"Task failed: {str(e)}"
-            
-            print(f"[Background Agent] Task {task_id} failed: {e}")
+            for task_id, *_ in turns:
+                self._fail_run(task_id, e)
+    
+    def _start_run(self, task_id: str, user_message: str, ai_response: str, conversation_context: list) -> Dict[str, Any]:
+        """Mark a task running and build the agent input"""
+        self._update(task_id, status="running", message="Task is running...")
+        
+        logger.info("[Background Agent] Task %s starting ReAct processing", task_id)
+        
+        # Create context for the ReAct agent
+        context = self._create_agent_context(user_message, ai_response, conversation_context)
+        return {"messages": [{"role": "user", "content": context}]}
+    
+    def _finish_run(self, task_id: str, response: Dict[str, Any], user_message: str, conversation_id: str):
+        """Record the agent's final answer as the task result"""
+        # The response carries the whole thread, so its length is the history length
+        self._history_len[conversation_id] = len(response["messages"])
+        
+        # Extract the final result
+        self._complete_run(task_id, response["messages"][-1].content, user_message)
+    
+    def _complete_run(self, task_id: str, final_message: str, user_message: str):
+        """Mark a task completed with the agent's analysis"""
+        # Parse the result to extract structured data
+        result = self._parse_agent_result(final_message, user_message)
+        
+        self._update(
+            task_id,
+            status="completed",
+            result=result,
+            completed_at=time.time(),
+            message="Task completed successfully"
+        )
+        self._signal_done(task_id)
+        
+        logger.info("[Background Agent] Task %s completed", task_id)
+    
+    def _fail_run(self, task_id: str, e: Exception):
+        """Record a failed run"""
+        self._update(
+            task_id,
+            status="error",
+            error=str(e),
+            completed_at=time.time(),
+            message=f"Task failed: {str(e)}"
+        )
+        self._signal_done(task_id)
+        
+        logger.error("[Background Agent] Task %s failed: %s", task_id, e)
+    
+    def wait_for_task(self, task_id: str, timeout: float = None) -> TaskResult:
+        """Block until a task is completed or failed (or timeout), then return its status"""
+        event = self.done_events.get(task_id)
+        if event is not None:
+            event.wait(timeout)
+        return self.get_task_status(task_id)
+    
+    def get_task_event(self, task_id: str) -> asyncio.Event:
+        """Event (bound to the calling loop) that is set on every status change of a task.
+
+        Callers should clear it before reading the status so no transition is
+        missed, and release it with release_task_event() when done.
+        """
+        watcher = self.task_events.get(task_id)
+        if watcher is None:
+            watcher = self.task_events.setdefault(
+                task_id, (asyncio.get_running_loop(), asyncio.Event())
+            )
+        return watcher[1]
+    
+    def release_task_event(self, task_id: str):
+        """Forget the watcher event for a task"""
+        self.task_events.pop(task_id, None)
+    
+    def _update(self, task_id: str, **changes):
+        """Swap in an updated snapshot of a task and wake its watcher.
+
+        Each task has one writer (its worker thread or coroutine), so
+        get-then-set cannot lose another thread's update.
+        """
+        task = self.tasks.get(task_id)
+        if task is not None:
+            self.tasks[task_id] = replace(task, **changes)
+            self._notify(task_id)
+    
+    def _signal_done(self, task_id: str):
+        """Release threads blocked in wait_for_task (threading.Event is thread-safe)"""
+        event = self.done_events.get(task_id)
+        if event is not None:
+            event.set()
+    
+    def _notify(self, task_id: str):
+        """Wake the async watcher of a task, if any (safe from any thread)"""
+        watcher = self.task_events.get(task_id)
+        if watcher:
+            loop, event = watcher
+            loop.call_soon_threadsafe(event.set)
     
     def _create_agent_context(self, user_message: str, ai_response: str, conversation_context: list) -> str:
         """Create context for the ReAct agent"""
@@ -151,6 +394,31 @@ AI: "{ai_response}"
 Please analyze this turn."""
         return context
     
+    def _create_batch_context(self, turns: List[tuple]) -> str:
+        """Create context asking the ReAct agent to analyze several turns at once"""
+        parts = [f"{len(turns)} new conversation turns:"]
+        for i, (_, user_message, ai_response, *_) in enumerate(turns, 1):
+            parts.append(f'Turn {i}:\nUser: "{user_message}"\nAI: "{ai_response}"')
+        parts.append(
+            f"Please analyze each turn. Reply with only a JSON array of {len(turns)} "
+            "strings, one analysis per turn, in order."
+        )
+        return "\n\n".join(parts)
+    
+    def _split_batch_result(self, agent_response: str, n_turns: int) -> List[str]:
+        """Split a batched answer into per-turn analyses (whole answer for each if it is not a matching JSON array)"""
+        text = agent_response.strip()
+        if text.startswith("```"):
+            # Drop a markdown code fence around the array
+            text = text.strip("`").partition("\n")[2]
+        try:
+            analyses = json.loads(text)
+        except ValueError:
+            analyses = None
+        if not isinstance(analyses, list) or len(analyses) != n_turns:
+            return [agent_response] * n_turns
+        return [a if isinstance(a, str) else json.dumps(a) for a in analyses]
+    
     def _parse_agent_result(self, agent_response: str, user_message: str) -> Dict[str, Any]:
         """Parse the agent response to extract structured result data"""
         # Since we're only doing conversation analysis, always return analysis result
@@ -164,66 +432,84 @@ Please analyze this turn."""
     
     def get_task_status(self, task_id: str) -> TaskResult:
         """Get the status of a specific task"""
-        with self.lock:
-            return self.tasks.get(task_id, TaskResult(
-                task_id=task_id,
-                status="not_found",
-                error="Task not found"
-            ))
+        return self.tasks.get(task_id) or TaskResult(
+            task_id=task_id,
+            status="not_found",
+            error="Task not found"
+        )
     
     def get_all_tasks(self) -> Dict[str, TaskResult]:
         """Get all tasks (for debugging)"""
-        with self.lock:
-            return self.tasks.copy()
+        return self.tasks.copy()
     
     def cleanup_old_tasks(self, max_age_seconds: int = 300):
         """Clean up tasks older than max_age_seconds"""
         current_time = time.time()
-        with self.lock:
-            to_remove = []
-            for task_id, task in self.tasks.items():
-                if current_time - task.created_at > max_age_seconds:
-                    to_remove.append(task_id)
-            
-            for task_id in to_remove:
-                del self.tasks[task_id]
-                print(f"[Background Agent] Cleaned up old task {task_id}")
+        # Tasks are ordered by creation, so stop at the first one still young
+        while self.tasks:
+            task_id = next(iter(self.tasks))
+            task = self.tasks.get(task_id)
+            if task is not None and current_time - task.created_at <= max_age_seconds:
+                break
+            self.tasks.pop(task_id, None)
+            self.done_events.pop(task_id, None)
+            logger.info("[Background Agent] Cleaned up old task %s", task_id)
+    
+    def get_history_length(self, conversation_id: str = DEFAULT_CONVERSATION_ID) -> int:
+        """Number of messages in a conversation's memory, without reading the checkpointer"""
+        return self._history_len.get(conversation_id, 0)
     
-    def get_conversation_history(self):
+    def get_conversation_history(self, conversation_id: str = DEFAULT_CONVERSATION_ID):
         """Get the conversation history from the checkpointer"""
         try:
             # Get the current state from the checkpointer
-            state = self.checkpointer.get(self.config)
+            state = self.checkpointer.get(self._config_for(conversation_id))
             if state and 'messages' in state.values:
                 messages = state.values['messages']
-                print(f"[Background Agent] Conversation history has {len(messages)} messages")
+                logger.info("[Background Agent] Conversation history has %d messages", len(messages))
                 return messages
             else:
-                print("[Background Agent] No conversation history found")
+                logger.info("[Background Agent] No conversation history found")
                 return []
         except Exception as e:
-            print(f"[Background Agent] Error getting conversation history: {e}")
+            logger.error("[Background Agent] Error getting conversation history: %s", e)
             return []
 
 # Global agent instance
 background_agent = ReActBackgroundAgent()
 
-def create_background_task(user_message: str, ai_response: str, conversation_context: list = None) -> str:
+def create_background_task(user_message: str, ai_response: str, conversation_context: list = None,
+                           conversation_id: str = DEFAULT_CONVERSATION_ID) -> str:
     """Create a background task and return task ID"""
-    return background_agent.create_task(user_message, ai_response, conversation_context)
+    return background_agent.create_task(user_message, ai_response, conversation_context, conversation_id)
 
 def get_task_status(task_id: str) -> Dict[str, Any]:
     """Get task status as dictionary"""
-    task = background_agent.get_task_status(task_id)
-    return asdict(task)
+    return background_agent.get_task_status(task_id)._cached_dict
+
+def get_task_event(task_id: str) -> asyncio.Event:
+    """Get an asyncio.Event that is set whenever the task's status changes"""
+    return background_agent.get_task_event(task_id)
+
+def wait_for_task(task_id: str, timeout: float = None) -> Dict[str, Any]:
+    """Block until the task is completed or failed, then return its status as dictionary"""
+    return background_agent.wait_for_task(task_id, timeout)._cached_dict
+
+def release_task_event(task_id: str):
+    """Release the event returned by get_task_event"""
+    background_agent.release_task_event(task_id)
 
 def cleanup_old_tasks():
     """Clean up old tasks"""
     background_agent.cleanup_old_tasks()
 
-def get_conversation_history():
+def get_history_length(conversation_id: str = DEFAULT_CONVERSATION_ID) -> int:
+    """Get the number of messages in the background agent's memory"""
+    return background_agent.get_history_length(conversation_id)
+
+def get_conversation_history(conversation_id: str = DEFAULT_CONVERSATION_ID):
     """Get the conversation history from the background agent's memory"""
-    return background_agent.get_conversation_history()
+    return background_agent.get_conversation_history(conversation_id)
 
 if __name__ == "__main__":
     # Test the conversation analysis background agent with memory
@@ -245,17 +531,12 @@ if __name__ == "__main__":
         task_id = create_background_task(user_msg, ai_msg, None)
         print(f"Created task: {task_id}")
         
-        # Poll for completion
-        while True:
-            status = get_task_status(task_id)
-            if status['status'] in ['completed', 'error']:
-                print(f"Analysis completed!")
-                break
-            time.sleep(0.5)
+        # Wait for completion
+        wait_for_task(task_id)
+        print(f"Analysis completed!")
         
-        # Show conversation history after each turn
-        history = get_conversation_history()
-        print(f"Conversation history now has {len(history)} messages")
+        # Show conversation history size after each turn
+        print(f"Conversation history now has {get_history_length()} messages")
     
     print("\n--- Final Conversation History ---")
     history = get_conversation_history()
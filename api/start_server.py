@@ -23,12 +23,34 @@ if __name__ == "__main__":
     print("📡 WebSocket endpoint: ws://localhost:8000/ws")
     print("🌐 API documentation: http://localhost:8000/docs")
     print("🔗 Frontend should connect to: http://localhost:3000")
+    
+    # Each worker is a separate process with its own connection manager and
+    # conversation history, so more than one needs sticky routing in front
+    # (see README). Auto-reload only works with a single worker.
+    workers = int(os.getenv("API_WORKERS", "1"))
+    if workers > 1:
+        print(f"👥 Workers: {workers} (use a sticky load balancer)")
+    # DEV=1 for auto-reload and info/access logging; otherwise production
+    # settings (warnings only, no per-request access log)
+    dev = bool(os.getenv("DEV"))
+    if dev:
+        print("🛠️  Development mode: auto-reload on")
     print("")
     
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=8000,
-        reload=True,
-        log_level="info"
+        reload=dev and workers == 1,
+        workers=workers,
+        log_level="info" if dev else "warning",
+        access_log=dev,
+        http="httptools",
+        ws_per_message_deflate=False,
+        # Protocol-level keepalive: ping every 20s, drop peers that miss the pong
+        ws_ping_interval=20,
+        ws_ping_timeout=20,
+        # libuv-backed event loop for every WebSocket endpoint (uvloop has no
+        # Windows build)
+        loop="asyncio" if sys.platform == "win32" else "uvloop"
     )
@@ -4,30 +4,36 @@ Simple test to check if background agents are working.
 """
 
 import asyncio
+import os
+import sys
 import websockets
-import json
 import time
 
+# Shared WebSocket test helpers live with the example scripts
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "examples"))
+from ws_test_utils import loads, dumps, WS_CONNECT_OPTIONS, IdleTimeout
+
+# Payloads are constant, so serialize them once at import
+TEST_MESSAGE = dumps({
+    "type": "user_message",
+    "content": "Hello! Can you help me analyze this conversation and provide some insights about the background agent system?"
+})
+
 async def test_background_agents():
     """Test if background agents are sending messages"""
     uri = "ws://localhost:8000/ws"
     
     try:
-        async with websockets.connect(uri) as websocket:
+        async with websockets.connect(uri, **WS_CONNECT_OPTIONS) as websocket:
             print("✅ Connected to WebSocket")
             
             # Wait for initial agent update
             response = await websocket.recv()
-            data = json.loads(response)
+            data = loads(response)
             print(f"📡 Received initial update: {data['type']}")
             
             # Send a test message that should trigger background agent
-            test_message = {
-                "type": "user_message",
-                "content": "Hello! Can you help me analyze this conversation and provide some insights about the background agent system?"
-            }
-            
-            await websocket.send(json.dumps(test_message))
+            await websocket.send(TEST_MESSAGE)
             print("📤 Sent test message to trigger background agent")
             
             # Monitor responses
@@ -37,37 +43,36 @@ async def test_background_agents():
             
             print("\n🔍 Monitoring for background agent messages...")
             
-            for i in range(20):  # Wait for up to 20 messages
-                try:
-                    response = await asyncio.wait_for(websocket.recv(), timeout=15.0)
-                    data = json.loads(response)
-                    message_count += 1
-                    
-                    print(f"\n📥 Message {message_count}: {data['type']}")
-                    
-                    if data['type'] == 'new_message':
-                        content = data['message']['content']
-                        is_agent_result = data['message'].get('is_agent_result', False)
+            # Ends after 15 s without a message (one timer, reset per message)
+            try:
+                async with IdleTimeout(15.0) as idle:
+                    for i in range(20):  # Wait for up to 20 messages
+                        response = await websocket.recv()
+                        idle.reset()
+                        data = loads(response)
+                        message_count += 1
+                        
+                        print(f"\n📥 Message {message_count}: {data['type']}")
                         
-                        if is_agent_result:
-                            agent_result_received = True
-                            print(f"   🎉 AGENT RESULT: {content}")
-                        else:
-                            print(f"   💬 Regular message: {content[:100]}...")
-                    
-                    elif data['type'] == 'agent_update':
-                        agent_updates_received += 1
-                        agent_in_loop = data.get('agent_in_loop', {})
-                        print(f"   🤖 Agent status: {agent_in_loop.get('status', 'unknown')}")
-                        if agent_in_loop.get('current_task'):
-                            print(f"   📋 Current task: {agent_in_loop['current_task']}")
-                    
-                    elif data['type'] == 'keepalive':
-                        print("   💓 Keepalive")
+                        if data['type'] == 'new_message':
+                            content = data['message']['content']
+                            is_agent_result = data['message'].get('is_agent_result', False)
+                            
+                            if is_agent_result:
+                                agent_result_received = True
+                                print(f"   🎉 AGENT RESULT: {content}")
+                            else:
+                                print(f"   💬 Regular message: {content[:100]}...")
                         
-                except asyncio.TimeoutError:
-                    print("⏰ Timeout waiting for response")
-                    break
+                        elif data['type'] == 'agent_update':
+                            agent_updates_received += 1
+                            agent_in_loop = data.get('agent_in_loop', {})
+                            print(f"   🤖 Agent status: {agent_in_loop.get('status', 'unknown')}")
+                            if agent_in_loop.get('current_task'):
+                                print(f"   📋 Current task: {agent_in_loop['current_task']}")
+                            
+            except asyncio.TimeoutError:
+                print("⏰ Timeout waiting for response")
             
             print(f"\n📊 Test Results:")
             print(f"   Total messages received: {message_count}")
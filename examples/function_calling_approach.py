@@ -8,123 +8,177 @@ trigger background tasks and handle their results.
 import asyncio
 import json
 import time
+from collections import deque
+from functools import lru_cache
+from itertools import islice
 from typing import Any, Dict
-from simple_background_agent import create_background_task, get_task_status
 
-class FunctionCallingBackgroundManager:
-    def __init__(self):
-        self.active_tasks = {}
-        self.conversation_history = []
-    
-    def get_session_tools(self):
-        """Define available functions for the model to call"""
-        return [
-            {
-                "type": "function",
-                "name": "send_email",
-                "description": "Send an email to a recipient with a subject and body",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "recipient": {
-                            "type": "string",
-                            "description": "Email address of the recipient"
-                        },
-                        "subject": {
-                            "type": "string", 
-                            "description": "Subject line of the email"
-                        },
-                        "body": {
-                            "type": "string",
-                            "description": "Body content of the email"
-                        }
-                    },
-                    "required": ["recipient", "subject", "body"]
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from simple_background_agent import create_background_task, get_task_status, get_task_event, release_task_event
+
+def _loads(data):
+    """Parse function call arguments (orjson when installed)"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def _dumps(obj) -> str:
+    """Serialize a function call output; the API expects a string"""
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj)
+
+@lru_cache(maxsize=None)
+def _completed_envelope(function_name: str):
+    """JSON text around the result of a completed call; only the result varies"""
+    head = '{"status":"completed","function":%s,"result":' % _dumps(function_name)
+    tail = ',"message":%s}' % _dumps(f"{function_name} completed successfully")
+    return head, tail
+
+# Results finishing within this window of each other are sent to the model
+# together and answered by a single response.create
+DELIVERY_BATCH_WINDOW = 0.01
+DELIVERY_BATCH_MAX = 16
+
+# Only the last few turns are passed to the agent; older ones are dropped
+HISTORY_MAX_TURNS = 16
+CONTEXT_TURNS = 3
+
+# Functions the model may call; static, so built once
+SESSION_TOOLS = [
+    {
+        "type": "function",
+        "name": "send_email",
+        "description": "Send an email to a recipient with a subject and body",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "recipient": {
+                    "type": "string",
+                    "description": "Email address of the recipient"
+                },
+                "subject": {
+                    "type": "string", 
+                    "description": "Subject line of the email"
+                },
+                "body": {
+                    "type": "string",
+                    "description": "Body content of the email"
                 }
             },
-            {
-                "type": "function",
-                "name": "update_calendar",
-                "description": "Schedule or update a calendar event",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "title": {
-                            "type": "string",
-                            "description": "Title of the calendar event"
-                        },
-                        "datetime": {
-                            "type": "string",
-                            "description": "Date and time of the event (ISO format preferred)"
-                        },
-                        "location": {
-                            "type": "string",
-                            "description": "Location of the event (optional)"
-                        },
-                        "description": {
-                            "type": "string",
-                            "description": "Description of the event (optional)"
-                        }
-                    },
-                    "required": ["title", "datetime"]
+            "required": ["recipient", "subject", "body"]
+        }
+    },
+    {
+        "type": "function",
+        "name": "update_calendar",
+        "description": "Schedule or update a calendar event",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "title": {
+                    "type": "string",
+                    "description": "Title of the calendar event"
+                },
+                "datetime": {
+                    "type": "string",
+                    "description": "Date and time of the event (ISO format preferred)"
+                },
+                "location": {
+                    "type": "string",
+                    "description": "Location of the event (optional)"
+                },
+                "description": {
+                    "type": "string",
+                    "description": "Description of the event (optional)"
                 }
             },
-            {
-                "type": "function",
-                "name": "research_topic",
-                "description": "Research a specific topic and gather information",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "topic": {
-                            "type": "string",
-                            "description": "The topic to research"
-                        },
-                        "depth": {
-                            "type": "string",
-                            "enum": ["quick", "detailed", "comprehensive"],
-                            "description": "How thorough the research should be"
-                        },
-                        "sources": {
-                            "type": "array",
-                            "items": {"type": "string"},
-                            "description": "Preferred sources to search (optional)"
-                        }
-                    },
-                    "required": ["topic", "depth"]
+            "required": ["title", "datetime"]
+        }
+    },
+    {
+        "type": "function",
+        "name": "research_topic",
+        "description": "Research a specific topic and gather information",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "topic": {
+                    "type": "string",
+                    "description": "The topic to research"
+                },
+                "depth": {
+                    "type": "string",
+                    "enum": ["quick", "detailed", "comprehensive"],
+                    "description": "How thorough the research should be"
+                },
+                "sources": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "Preferred sources to search (optional)"
                 }
             },
-            {
-                "type": "function",
-                "name": "background_processing",
-                "description": "Perform general background processing or analysis",
-                "parameters": {
+            "required": ["topic", "depth"]
+        }
+    },
+    {
+        "type": "function",
+        "name": "background_processing",
+        "description": "Perform general background processing or analysis",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "task_type": {
+                    "type": "string",
+                    "description": "Type of background task to perform"
+                },
+                "data": {
                     "type": "object",
-                    "properties": {
-                        "task_type": {
-                            "type": "string",
-                            "description": "Type of background task to perform"
-                        },
-                        "data": {
-                            "type": "object",
-                            "description": "Data or context for the background task"
-                        },
-                        "priority": {
-                            "type": "string",
-                            "enum": ["low", "medium", "high"],
-                            "description": "Priority level of the task"
-                        }
-                    },
-                    "required": ["task_type"]
+                    "description": "Data or context for the background task"
+                },
+                "priority": {
+                    "type": "string",
+                    "enum": ["low", "medium", "high"],
+                    "description": "Priority level of the task"
                 }
-            }
-        ]
+            },
+            "required": ["task_type"]
+        }
+    }
+]
+
+# Function name -> builder of the user message handed to the background agent
+FUNCTION_MESSAGES = {
+    "send_email": lambda a: f"Send email to {a.get('recipient')} with subject '{a.get('subject')}' and body '{a.get('body')}'",
+    "update_calendar": lambda a: f"Schedule calendar event '{a.get('title')}' for {a.get('datetime')} at {a.get('location', 'TBD')}",
+    "research_topic": lambda a: f"Research topic '{a.get('topic')}' with {a.get('depth')} depth",
+    "background_processing": lambda a: f"Perform {a.get('task_type')} background processing with data {a.get('data', {})}",
+}
+
+class FunctionCallingBackgroundManager:
+    __slots__ = ("active_tasks", "conversation_history", "_delivery_queue", "_delivery_task")
+
+    def __init__(self):
+        self.active_tasks = {}
+        self.conversation_history = deque(maxlen=HISTORY_MAX_TURNS)
+        # (connection, task_id, status) of finished tasks; queue and worker
+        # are created on first use so the manager can be built outside a loop
+        self._delivery_queue = None
+        self._delivery_task = None
+    
+    def get_session_tools(self):
+        """Define available functions for the model to call"""
+        return SESSION_TOOLS
     
     async def handle_function_call(self, connection, function_call_item):
         """Handle a function call from the model"""
         function_name = function_call_item.get("name")
         call_id = function_call_item.get("call_id")
-        arguments = json.loads(function_call_item.get("arguments", "{}"))
+        arguments = _loads(function_call_item.get("arguments") or "{}")
         
         print(f"[Function Call] {function_name} called with args: {arguments}")
         
@@ -149,7 +203,7 @@ class FunctionCallingBackgroundManager:
             "item": {
                 "type": "function_call_output",
                 "call_id": call_id,
-                "output": json.dumps({
+                "output": _dumps({
                     "status": "processing",
                     "message": f"Starting {function_name} task...",
                     "task_id": task_id
@@ -161,14 +215,9 @@ class FunctionCallingBackgroundManager:
         """Create a background task based on function call arguments"""
         
         # Convert function call to a user message for the background agent
-        if function_name == "send_email":
-            user_message = f"Send email to {arguments.get('recipient')} with subject '{arguments.get('subject')}' and body '{arguments.get('body')}'"
-        elif function_name == "update_calendar":
-            user_message = f"Schedule calendar event '{arguments.get('title')}' for {arguments.get('datetime')} at {arguments.get('location', 'TBD')}"
-        elif function_name == "research_topic":
-            user_message = f"Research topic '{arguments.get('topic')}' with {arguments.get('depth')} depth"
-        elif function_name == "background_processing":
-            user_message = f"Perform {arguments.get('task_type')} background processing with data {arguments.get('data', {})}"
+        formatter = FUNCTION_MESSAGES.get(function_name)
+        if formatter is not None:
+            user_message = formatter(arguments)
         else:
             user_message = f"Execute {function_name} with arguments {arguments}"
         
@@ -176,89 +225,104 @@ class FunctionCallingBackgroundManager:
         task_id = create_background_task(
             user_message,
             f"Executing {function_name} function call",
-            self.conversation_history[-3:] if self.conversation_history else []
+            list(islice(self.conversation_history, max(0, len(self.conversation_history) - CONTEXT_TURNS), None))
         )
         
         return task_id
     
     async def _monitor_function_task(self, connection, task_id: str):
         """Monitor a function task and provide results when complete"""
-        while task_id in self.active_tasks and not self.active_tasks[task_id]["completed"]:
-            status = get_task_status(task_id)
-            
-            if status['status'] == 'completed':
-                await self._deliver_function_result(connection, task_id, status['result'])
-                break
-            elif status['status'] == 'error':
-                await self._deliver_function_error(connection, task_id, status['error'])
-                break
+        # Woken by the agent on each status change instead of polling
+        event = get_task_event(task_id)
+        try:
+            while task_id in self.active_tasks and not self.active_tasks[task_id]["completed"]:
+                # Clear before reading so a transition in between is not missed
+                event.clear()
+                status = get_task_status(task_id)
+                
+                if status['status'] in ('completed', 'error', 'not_found'):
+                    self._queue_delivery(connection, task_id, status)
+                    break
+                
+                await event.wait()
+        finally:
+            release_task_event(task_id)
+    
+    def _queue_delivery(self, connection, task_id: str, status: dict):
+        """Hand a finished task to the delivery worker"""
+        if self._delivery_task is None or self._delivery_task.done():
+            self._delivery_queue = asyncio.Queue()
+            self._delivery_task = asyncio.create_task(self._delivery_loop())
+        self._delivery_queue.put_nowait((connection, task_id, status))
+    
+    async def _delivery_loop(self):
+        """Deliver finished tasks to the model in batches"""
+        queue = self._delivery_queue
+        while True:
+            batch = [await queue.get()]
+            # Collect whatever else finishes within the batching window
+            while len(batch) < DELIVERY_BATCH_MAX:
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout=DELIVERY_BATCH_WINDOW))
+                except asyncio.TimeoutError:
+                    break
             
-            await asyncio.sleep(0.5)
+            by_connection = {}
+            for connection, task_id, status in batch:
+                by_connection.setdefault(connection, []).append((task_id, status))
+            for connection, finished in by_connection.items():
+                await self._deliver_function_outputs(connection, finished)
     
-    async def _deliver_function_result(self, connection, task_id: str, result: dict):
-        """Deliver function call result back to the model"""
-        if task_id not in self.active_tasks:
-            return
-        
-        task_info = self.active_tasks[task_id]
-        call_id = task_info["call_id"]
-        function_name = task_info["function_name"]
-        
+    async def _deliver_function_outputs(self, connection, finished: list):
+        """Deliver function call results/errors back to the model with one response"""
+        delivered = []
         try:
-            # Create function call output with the result
-            await connection.conversation.item.create(
-                item={
-                    "type": "function_call_output",
-                    "call_id": call_id,
-                    "output": json.dumps({
-                        "status": "completed",
-                        "function": function_name,
-                        "result": result,
-                        "message": f"{function_name} completed successfully"
-                    })
-                }
-            )
+            for task_id, status in finished:
+                if task_id not in self.active_tasks:
+                    continue
+                
+                await connection.conversation.item.create(
+                    item=self._function_output(task_id, status)
+                )
+                delivered.append(task_id)
             
-            # Generate a response using the function result
+            if not delivered:
+                return
+            
+            # Generate a single response covering all the delivered outputs
             await connection.response.create()
             
-            self.active_tasks[task_id]["completed"] = True
-            print(f"[Function Call] Delivered result for {function_name} (task {task_id})")
+            for task_id in delivered:
+                task_info = self.active_tasks.get(task_id)
+                if task_info is not None:
+                    task_info["completed"] = True
+                    print(f"[Function Call] Delivered output for {task_info['function_name']} (task {task_id})")
             
         except Exception as e:
-            print(f"[Function Call] Failed to deliver result: {e}")
+            print(f"[Function Call] Failed to deliver outputs: {e}")
     
-    async def _deliver_function_error(self, connection, task_id: str, error: str):
-        """Deliver function call error back to the model"""
-        if task_id not in self.active_tasks:
-            return
-        
+    def _function_output(self, task_id: str, status: dict) -> dict:
+        """Build the function_call_output item for a finished task"""
         task_info = self.active_tasks[task_id]
-        call_id = task_info["call_id"]
         function_name = task_info["function_name"]
         
-        try:
-            await connection.conversation.item.create(
-                item={
-                    "type": "function_call_output",
-                    "call_id": call_id,
-                    "output": json.dumps({
-                        "status": "error",
-                        "function": function_name,
-                        "error": error,
-                        "message": f"{function_name} failed: {error}"
-                    })
-                }
-            )
-            
-            # Generate a response about the error
-            await connection.response.create()
-            
-            self.active_tasks[task_id]["completed"] = True
-            print(f"[Function Call] Delivered error for {function_name} (task {task_id})")
-            
-        except Exception as e:
-            print(f"[Function Call] Failed to deliver error: {e}")
+        if status['status'] == 'completed':
+            head, tail = _completed_envelope(function_name)
+            output = head + _dumps(status['result']) + tail
+        else:
+            error = status['error']
+            output = _dumps({
+                "status": "error",
+                "function": function_name,
+                "error": error,
+                "message": f"{function_name} failed: {error}"
+            })
+        
+        return {
+            "type": "function_call_output",
+            "call_id": task_info["call_id"],
+            "output": output
+        }
     
     def add_conversation_turn(self, user_message: str, ai_response: str):
         """Add a conversation turn to history"""
@@ -8,28 +8,31 @@ import subprocess
 import sys
 import time
 import os
-from pathlib import Path
 
 def check_requirements():
     """Check if required files and directories exist"""
     print("🔍 Checking system requirements...")
     
+    # One directory read; DirEntry's type checks use the cached d_type
+    found = {".env": False, "api": False, "frontend": False}
+    with os.scandir(".") as entries:
+        for entry in entries:
+            if entry.name in found:
+                found[entry.name] = entry.is_file() if entry.name == ".env" else entry.is_dir()
+    
     # Check for .env file
-    env_file = Path(".env")
-    if not env_file.exists():
+    if not found[".env"]:
         print("⚠️  Warning: .env file not found!")
         print("   Create a .env file with: OPENAI_API_KEY=your_key_here")
         return False
     
     # Check for API directory
-    api_dir = Path("api")
-    if not api_dir.exists():
+    if not found["api"]:
         print("❌ API directory not found!")
         return False
     
     # Check for frontend directory
-    frontend_dir = Path("frontend")
-    if not frontend_dir.exists():
+    if not found["frontend"]:
         print("❌ Frontend directory not found!")
         return False
     
@@ -40,11 +43,9 @@ def start_api_server():
     """Start the FastAPI server"""
     print("\n🚀 Starting FastAPI server...")
     try:
-        # Change to API directory and start server
-        os.chdir("api")
-        subprocess.Popen([
-            sys.executable, "start_server.py"
-        ], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        # Start the server from the API directory. Its output goes to this
+        # terminal: a pipe nobody reads fills up and stalls the server
+        subprocess.Popen([sys.executable, "start_server.py"], cwd="api")
         print("✅ FastAPI server started on http://localhost:8000")
         return True
     except Exception as e:
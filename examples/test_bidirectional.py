@@ -1,78 +1,286 @@
 import asyncio
-import base64
+import io
 import json
 import os
+import sys
 import time
+from collections import deque
 from typing import Any
 
-import numpy as np
 import sounddevice as sd  # Mic + speaker
 from openai import AsyncOpenAI
-from langsmith import traceable, Client
+from websockets.exceptions import ConnectionClosedOK
 from dotenv import load_dotenv
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# NumPy (vectorized min/max) for the optional local VAD; a memoryview scan otherwise
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# pybase64 (SIMD) when installed, stdlib otherwise; same signatures
+try:
+    from pybase64 import b64decode, b64encode
+except ImportError:
+    from base64 import b64decode, b64encode
+
 # Import our simple background agent
-from simple_background_agent import create_background_task, get_task_status, cleanup_old_tasks
+from simple_background_agent import (
+    create_background_task,
+    get_task_status,
+    get_task_event,
+    release_task_event,
+    cleanup_old_tasks
+)
+# Lock-free SPSC byte ring shared with the PortAudio callback
+from audio_service import RingBuffer
 
 load_dotenv(override=True)
 
-# ---- LangSmith setup ----
-langsmith_client = Client()
+# ---- LangSmith setup (only when LANGSMITH_TRACING is on) ----
+LANGSMITH_TRACING = os.getenv("LANGSMITH_TRACING", "").lower() == "true"
+if LANGSMITH_TRACING:
+    from langsmith import traceable, Client
+    langsmith_client = Client()
+else:
+    langsmith_client = None
+
+    def traceable(*args, **kwargs):
+        """No-op stand-in for langsmith.traceable when tracing is off"""
+        return lambda fn: fn
 
 # ---- Audio params (keep them in sync for input/output) ----
 SAMPLE_RATE = 24000  # common realtime model rate
 CHANNELS = 1
 DTYPE = "int16"
 CHUNK_MS = 20
-FRAMES_PER_CHUNK = int(SAMPLE_RATE * CHUNK_MS / 1000)
+FRAMES_PER_CHUNK = SAMPLE_RATE * CHUNK_MS // 1000  # 480
+# PortAudio block size; 20 ms framing by default. Set AUDIO_BLOCKSIZE to
+# match a device's native period (e.g. 512) or to 0 to let PortAudio pick
+AUDIO_BLOCKSIZE = int(os.getenv("AUDIO_BLOCKSIZE", FRAMES_PER_CHUNK))
 
-# ---- Playback sink ----
-class Speaker:
-    def __init__(self) -> None:
-        self.stream = sd.OutputStream(
-            samplerate=SAMPLE_RATE,
-            channels=CHANNELS,
-            dtype=DTYPE,
-            blocksize=FRAMES_PER_CHUNK,
-        )
-        self.stream.start()
+# Client events are sent pre-serialized with conn.send_raw, skipping the
+# SDK's stdlib json pass. base64 never needs JSON escaping, so audio appends
+# are built by concatenation
+CANCEL_EVENT = '{"type":"response.cancel"}'  # sent on barge-in
+AUDIO_APPEND_PREFIX = b'{"type":"input_audio_buffer.append","audio":"'
+AUDIO_APPEND_SUFFIX = b'"}'
 
-    def play_bytes(self, pcm_bytes: bytes) -> None:
-        # bytes(int16 little-endian) -> numpy -> write
-        audio = np.frombuffer(pcm_bytes, dtype=np.int16)
-        # Reshape for mono/stereo as needed
-        audio = audio.reshape(-1, CHANNELS) if CHANNELS > 1 else audio
-        self.stream.write(audio)
+def event_json(event: dict) -> str:
+    """Serialize a client event for send_raw (orjson when installed)"""
+    if orjson is not None:
+        return orjson.dumps(event).decode()
+    return json.dumps(event, separators=(",", ":"))
 
-    def close(self) -> None:
-        self.stream.stop(); self.stream.close()
+_loads = orjson.loads if orjson is not None else json.loads
+
+async def server_events(conn):
+    """Yield inbound server events as plain dicts.
+
+    Replaces `async for event in conn`, which runs every frame through stdlib
+    json and a pydantic model; audio deltas arrive every ~20 ms and only need
+    two fields, so raw frames are decoded with orjson when installed.
+    """
+    while True:
+        try:
+            data = await conn.recv_bytes()
+        except ConnectionClosedOK:
+            return
+        yield _loads(data)
+
+TRANSCRIPT_FLUSH_S = 0.1  # live transcript reaches stdout at most this often
+
+# ---- Audio device (mic + speaker on one duplex stream) ----
+BYTES_PER_CHUNK = FRAMES_PER_CHUNK * CHANNELS * 2  # int16 samples
+MIC_QUEUE_CHUNKS = 8  # ~160 ms of capture; older chunks are dropped beyond that
+PLAYBACK_CHUNKS = 3000  # ~60 s; the model streams audio faster than real time
+# Digital silence (muted or gated input) repeats the same all-zero block, so
+# its append event is encoded once
+ZERO_PCM = bytes(BYTES_PER_CHUNK)
+SILENT_APPEND_EVENT = (AUDIO_APPEND_PREFIX + b64encode(ZERO_PCM) + AUDIO_APPEND_SUFFIX).decode("ascii")
+# Optional local VAD: blocks whose peak stays under LOCAL_VAD_THRESHOLD are
+# not sent once the hangover has run out. Off by default (0): semantic_vad
+# needs the trailing silence to end a turn, hence the long hangover
+LOCAL_VAD_THRESHOLD = int(os.getenv("LOCAL_VAD_THRESHOLD", "0"))
+VAD_HANGOVER_CHUNKS = 100  # keep sending 2 s of quiet after the last voiced block
+VAD_PREROLL_CHUNKS = 10  # held-back quiet blocks (200 ms) sent ahead of speech onset
 
-# ---- Microphone source ----
-class Microphone:
+def append_event(pcm) -> str:
+    """Serialized input_audio_buffer.append event for a block of int16 PCM"""
+    # The zero check stops at the first non-zero byte, so speech pays almost
+    # nothing for it
+    if memoryview(pcm).cast("B") == ZERO_PCM:
+        return SILENT_APPEND_EVENT
+    return (AUDIO_APPEND_PREFIX + b64encode(pcm) + AUDIO_APPEND_SUFFIX).decode("ascii")
+
+def peak_level(pcm) -> int:
+    """Largest absolute sample value in a block of int16 PCM"""
+    if np is not None:
+        samples = np.frombuffer(pcm, dtype=np.int16)
+        return max(int(samples.max()), -int(samples.min()))
+    samples = memoryview(pcm).cast("B").cast("h")
+    return max(max(samples), -min(samples))
+
+class AudioDevice:
     def __init__(self) -> None:
-        self.stream = sd.InputStream(
+        # One PortAudio callback per block serves both directions. Captured
+        # chunks are handed to the loop and playback is pulled from a ring,
+        # so neither side blocks the loop (must be built inside the loop)
+        self.loop = None
+        self.queue: asyncio.Queue = None
+        self._playback = RingBuffer(PLAYBACK_CHUNKS * BYTES_PER_CHUNK)
+        self._silence = memoryview(bytes(BYTES_PER_CHUNK))
+        # Set by flush_playback(); the callback (the ring's consumer) clears
+        self._flush = False
+        # Health counters, written only by the callback: PortAudio-reported
+        # output underflows, and blocks where playback data ran out mid-block
+        self.underflows = 0
+        self.starved_blocks = 0
+        # Local VAD state (callback only): quiet blocks held back, and how
+        # many more quiet blocks to send before gating
+        self._preroll = deque(maxlen=VAD_PREROLL_CHUNKS)
+        self._hangover = 0
+        self.stream = sd.RawStream(
             samplerate=SAMPLE_RATE,
-            channels=CHANNELS,
+            channels=(CHANNELS, CHANNELS),
             dtype=DTYPE,
-            blocksize=FRAMES_PER_CHUNK,
+            blocksize=AUDIO_BLOCKSIZE,
+            latency="low",
+            callback=self._on_audio,
         )
-        self.stream.start()
+        self.resume()
+
+    def _on_audio(self, indata, outdata, frames, time_info, status) -> None:
+        # PortAudio thread: build the whole append event here (encoding also
+        # copies the block out of PortAudio's reused buffer) so the loop gets
+        # a ready-to-send string; one ASCII decode, no str concatenation
+        if not LOCAL_VAD_THRESHOLD:
+            self.loop.call_soon_threadsafe(self._push, append_event(indata))
+        elif peak_level(indata) >= LOCAL_VAD_THRESHOLD:
+            self._hangover = VAD_HANGOVER_CHUNKS
+            if self._preroll:
+                # Speech onset: send the held-back blocks with this one as a
+                # single append so the leading edge is not clipped
+                self._preroll.append(bytes(indata))
+                pcm = b"".join(self._preroll)
+                self._preroll.clear()
+            else:
+                pcm = indata
+            self.loop.call_soon_threadsafe(self._push, append_event(pcm))
+        elif self._hangover:
+            self._hangover -= 1
+            self.loop.call_soon_threadsafe(self._push, append_event(indata))
+        else:
+            # Quiet: nothing is encoded or sent, the copy only feeds the pre-roll
+            self._preroll.append(bytes(indata))
+        if status.output_underflow:
+            self.underflows += 1
+        if self._flush:
+            self._flush = False
+            self._playback.clear()
+        # Play what is buffered, silence for the rest of the block
+        view = memoryview(outdata).cast("B")
+        n = self._playback.read_into(view)
+        if n < len(view):
+            if n:
+                self.starved_blocks += 1
+            gap = len(view) - n
+            view[n:] = self._silence[:gap] if gap <= len(self._silence) else bytes(gap)
+
+    def _push(self, chunk) -> None:
+        # Event loop: if the consumer fell behind, drop the oldest chunk
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(chunk)
+
+    async def read_chunk(self) -> str:
+        """Next captured chunk as a serialized input_audio_buffer.append event"""
+        return await self.queue.get()
+
+    async def play_bytes(self, pcm_bytes: bytes) -> None:
+        """Queue PCM (int16 little-endian) for playback, waiting while the ring is full"""
+        pending = memoryview(pcm_bytes)
+        while pending:
+            pending = pending[self._playback.write(pending):]
+            if pending:
+                await asyncio.sleep(CHUNK_MS / 1000)
+
+    def resume(self) -> None:
+        """Bind to the running loop and start the stream if it is stopped"""
+        loop = asyncio.get_running_loop()
+        if loop is not self.loop:
+            # Captured chunks belong to the session on this loop
+            self.loop = loop
+            self.queue = asyncio.Queue(maxsize=MIC_QUEUE_CHUNKS)
+        if self.stream.stopped:
+            self.stream.start()
 
-    def read_chunk(self) -> bytes:
-        frames, _ = self.stream.read(FRAMES_PER_CHUNK)
-        return frames.tobytes()
+    def pause(self) -> None:
+        """Stop the stream but keep it open for the next session"""
+        self.stream.stop()
+        self._playback.clear()
+
+    def flush_playback(self) -> None:
+        """Drop buffered playback; the callback clears the ring on its next block"""
+        self._flush = True
 
     def close(self) -> None:
         self.stream.stop(); self.stream.close()
+        print(f"[Audio] Output underflows: {self.underflows}, starved playback blocks: {self.starved_blocks}")
+
+# ---- Process-wide client and audio device (created on first use) ----
+_client = None
+_audio = None
+
+def get_client() -> AsyncOpenAI:
+    """Shared AsyncOpenAI client; reads OPENAI_API_KEY"""
+    global _client
+    if _client is None:
+        _client = AsyncOpenAI()
+    return _client
+
+def get_audio_device() -> AudioDevice:
+    """Shared AudioDevice, resumed for the calling loop; reopened only if it failed"""
+    global _audio
+    if _audio is not None and not _audio.stream.closed:
+        try:
+            _audio.resume()
+            return _audio
+        except sd.PortAudioError as e:
+            print(f"[Audio] Reopening device: {e}")
+            _audio.stream.close()
+    _audio = AudioDevice()
+    return _audio
+
+def close_audio_device() -> None:
+    """Close the shared AudioDevice, if one was opened"""
+    global _audio
+    if _audio is not None and not _audio.stream.closed:
+        _audio.close()
+    _audio = None
 
 # ---- Enhanced Background Task Manager with Out-of-Band Responses ----
+HISTORY_MAX_TURNS = 256
+# Completed-analysis messages: fixed prefix plus the (truncated) analysis
+ANALYSIS_PREFIX = "🧠 Conversation analysis: "
+ANALYSIS_MAX_CHARS = 200
+
 class EnhancedBackgroundTaskManager:
     def __init__(self):
         self.active_tasks = {}  # task_id -> task_info
-        self.conversation_history = []
+        # Recent turns only; the agent keeps the full history in its checkpointer
+        self.conversation_history = deque(maxlen=HISTORY_MAX_TURNS)
         self.connection = None
         self.task_counter = 0
         self.pending_results = []  # Buffer for completed results waiting to be delivered
+        # "\n• message" per pending result, written as results are buffered so
+        # the combined delivery text is ready without another pass
+        self._pending_buf = io.StringIO()
         self.user_speaking = False  # Track if user is currently speaking
         self.response_in_progress = False  # Track if a response is being generated
     
@@ -90,13 +298,15 @@ class EnhancedBackgroundTaskManager:
             self.print_pending_results()
             asyncio.create_task(self._deliver_pending_results())
     
-    async def on_conversation_turn_complete(self, user_message: str, ai_response: str):
+    async def on_conversation_turn_complete(self, user_message: str, ai_response: str, timestamp: float = None):
         """Create background task after each conversation turn"""
+        if timestamp is None:
+            timestamp = time.time()
         # Add to conversation history
         turn = {
             "user": user_message,
             "ai": ai_response,
-            "timestamp": time.time()
+            "timestamp": timestamp
         }
         self.conversation_history.append(turn)
         
@@ -109,7 +319,7 @@ class EnhancedBackgroundTaskManager:
         )
         
         self.active_tasks[task_id] = {
-            "created_at": time.time(),
+            "created_at": timestamp,
             "user_message": user_message,
             "ai_response": ai_response,
             "delivered": False
@@ -122,17 +332,24 @@ class EnhancedBackgroundTaskManager:
     
     async def _monitor_task(self, task_id: str):
         """Monitor a specific task and deliver result when ready"""
-        while task_id in self.active_tasks:
-            status = get_task_status(task_id)
-            
-            if status['status'] == 'completed':
-                await self._buffer_result(task_id, status['result'])
-                break
-            elif status['status'] == 'error':
-                await self._buffer_error(task_id, status['error'])
-                break
-            
-            await asyncio.sleep(0.5)  # Check every 500ms
+        # Woken by the agent on every status change instead of polling
+        changed = get_task_event(task_id)
+        try:
+            while task_id in self.active_tasks:
+                # Clear before reading so a transition in between is not missed
+                changed.clear()
+                status = get_task_status(task_id)
+                
+                if status['status'] == 'completed':
+                    await self._buffer_result(task_id, status['result'])
+                    break
+                elif status['status'] in ('error', 'not_found'):
+                    await self._buffer_error(task_id, status['error'])
+                    break
+                
+                await changed.wait()
+        finally:
+            release_task_event(task_id)
     
     async def _buffer_result(self, task_id: str, result: dict):
         """Buffer a completed result instead of delivering immediately"""
@@ -142,7 +359,7 @@ class EnhancedBackgroundTaskManager:
             "task_id": task_id,
             "message": completion_message
         }
-        self.pending_results.append(buffered_item)
+        self._add_pending(buffered_item)
         self.active_tasks[task_id]["delivered"] = True
         print(f"[Background] Buffered result for task {task_id}")
         print(f"[Background] Buffered content: {completion_message}")
@@ -156,34 +373,42 @@ class EnhancedBackgroundTaskManager:
             "task_id": task_id,
             "message": error_message
         }
-        self.pending_results.append(buffered_item)
+        self._add_pending(buffered_item)
         self.active_tasks[task_id]["delivered"] = True
         print(f"[Background] Buffered error for task {task_id}")
         print(f"[Background] Buffered error content: {error_message}")
     
+    def _add_pending(self, buffered_item: dict):
+        """Queue a buffered result for the next delivery"""
+        self.pending_results.append(buffered_item)
+        self._pending_buf.write("\n• ")
+        self._pending_buf.write(buffered_item["message"])
+    
     async def _deliver_pending_results(self):
         """Deliver all pending results when user finishes speaking"""
         if not self.pending_results or not self.connection or self.response_in_progress:
             return
         
-        print(f"[Background] Delivering {len(self.pending_results)} pending results")
-        print(f"[Background] Pending results details:")
-        for i, result in enumerate(self.pending_results):
-            print(f"  [{i+1}] Type: {result['type']}, Task: {result['task_id']}")
-            print(f"      Message: {result['message']}")
+        # One write for the whole listing instead of two prints per result
+        print("\n".join([
+            f"[Background] Delivering {len(self.pending_results)} pending results",
+            "[Background] Pending results details:",
+            *self._pending_lines()
+        ]))
         
         # Combine all pending results into a single message
         if len(self.pending_results) == 1:
             combined_message = self.pending_results[0]["message"]
         else:
-            combined_message = "Here are the results from the background tasks:\n" + "\n".join([f"• {result['message']}" for result in self.pending_results])
+            combined_message = "Here are the results from the background tasks:" + self._pending_buf.getvalue()
         
         print(f"[Background] Combined message to deliver: {combined_message}")
         
         try:
             # Add the combined result as a conversation item to the main conversation
-            await self.connection.conversation.item.create(
-                item={
+            await self.connection.send_raw(event_json({
+                "type": "conversation.item.create",
+                "item": {
                     "type": "message",
                     "role": "assistant",
                     "content": [{
@@ -191,7 +416,7 @@ class EnhancedBackgroundTaskManager:
                         "text": combined_message
                     }]
                 }
-            )
+            }))
             
             # Don't generate a response automatically - let the user speak first
             print(f"[Background] Successfully delivered {len(self.pending_results)} buffered results to conversation")
@@ -201,6 +426,9 @@ class EnhancedBackgroundTaskManager:
         
         # Clear the pending results
         self.pending_results.clear()
+        self._pending_buf = io.StringIO()
+        # Their tasks are done with; don't let them pile up until shutdown
+        self.cleanup_completed_tasks()
     
     async def _deliver_result_out_of_band(self, task_id: str, result: dict):
         """Deliver background task result by injecting into main conversation"""
@@ -237,9 +465,9 @@ class EnhancedBackgroundTaskManager:
         # For conversation analysis, show a summary instead of the full message
         message = result.get('message', 'Conversation insights gathered')
         # Truncate very long analysis messages
-        if len(message) > 200:
-            message = message[:200] + "..."
-        return f"🧠 Conversation analysis: {message}"
+        if len(message) > ANALYSIS_MAX_CHARS:
+            message = message[:ANALYSIS_MAX_CHARS] + "..."
+        return ANALYSIS_PREFIX + message
     
     def _create_context_prompt(self, task_id: str, result: dict) -> str:
         """Create a context-aware prompt for the out-of-band response"""
@@ -283,23 +511,23 @@ Be natural and helpful in your response.
     
     def cleanup_completed_tasks(self):
         """Clean up delivered tasks"""
-        to_remove = []
-        for task_id, task_info in self.active_tasks.items():
-            if task_info.get("delivered", False):
-                to_remove.append(task_id)
-        
-        for task_id in to_remove:
-            del self.active_tasks[task_id]
+        self.active_tasks = {
+            task_id: task_info
+            for task_id, task_info in self.active_tasks.items()
+            if not task_info.get("delivered", False)
+        }
     
     def print_pending_results(self):
         """Print current pending results for debugging"""
-        print(f"[Background] Current pending results: {len(self.pending_results)}")
-        if self.pending_results:
-            for i, result in enumerate(self.pending_results):
-                print(f"  [{i+1}] Type: {result['type']}, Task: {result['task_id']}")
-                print(f"      Message: {result['message']}")
-        else:
-            print("  No pending results")
+        lines = [f"[Background] Current pending results: {len(self.pending_results)}"]
+        lines.extend(self._pending_lines() if self.pending_results else ["  No pending results"])
+        print("\n".join(lines))
+    
+    def _pending_lines(self):
+        """Debug listing of the pending results, two lines each"""
+        for i, result in enumerate(self.pending_results, 1):
+            yield f"  [{i}] Type: {result['type']}, Task: {result['task_id']}"
+            yield f"      Message: {result['message']}"
 
 # ---- LangSmith instrumentation functions ----
 @traceable(client=langsmith_client, run_type="chain", name="User Message")
@@ -320,12 +548,25 @@ def log_ai_response(message: str, timestamp: float) -> dict:
         "message_type": "ai_response"
     }
 
+# Logging tasks still in flight; holding a reference keeps them from being
+# garbage-collected before they finish
+_pending_logs = set()
+
+def log_in_background(log_fn, message: str, timestamp: float) -> None:
+    """Run a LangSmith log call in a worker thread, off the event dispatch path"""
+    if not LANGSMITH_TRACING:
+        return
+    # to_thread copies the current context, so the run still nests under
+    # the Conversation Session trace
+    task = asyncio.create_task(asyncio.to_thread(log_fn, message, timestamp))
+    _pending_logs.add(task)
+    task.add_done_callback(_pending_logs.discard)
+
 @traceable(client=langsmith_client, run_type="chain", name="Conversation Session")
 async def main() -> None:
-    # 1) Create client and open a realtime session (WebSocket)
-    client = AsyncOpenAI()  # reads OPENAI_API_KEY
-    speaker = Speaker()
-    mic = Microphone()
+    # 1) Reuse the client and audio device, and open a realtime session (WebSocket)
+    client = get_client()
+    audio = get_audio_device()
     
     # Initialize enhanced background task manager
     background_manager = EnhancedBackgroundTaskManager()
@@ -363,80 +604,127 @@ async def main() -> None:
             # 3) Task A: send mic audio chunks to the model continuously
             async def pump_mic() -> None:
                 while True:
-                    pcm = mic.read_chunk()
-                    # Cancel any active response when new audio comes in (prevents overlap)
-                    if response_active:
-                        try:
-                            await conn.send({"type": "response.cancel"})
-                        except Exception as e:
-                            print(f"[cancel error] {e}")
-                    await conn.input_audio_buffer.append(
-                        audio=base64.b64encode(pcm).decode("utf-8")
-                    )
-                    await asyncio.sleep(0)  # yield to event loop
+                    chunk = await audio.read_chunk()
+                    await conn.send_raw(chunk)
 
             # 4) Task B: play model audio as it streams back
             response_active = False
             current_user_message = None
+            # Transcript deltas not yet written, and when stdout was last flushed
+            transcript_parts = []
+            transcript_flushed_at = time.monotonic()
+            
+            def flush_transcript() -> None:
+                nonlocal transcript_flushed_at
+                sys.stdout.write("".join(transcript_parts))
+                sys.stdout.flush()
+                transcript_parts.clear()
+                transcript_flushed_at = time.monotonic()
+            
+            async def on_audio_delta(event) -> None:
+                # Base64 -> bytes -> speaker
+                pcm_bytes = b64decode(event["delta"])
+                await audio.play_bytes(pcm_bytes)
+            
+            async def on_transcript_delta(event) -> None:
+                # Live transcript of audio output, one stdout write per
+                # TRANSCRIPT_FLUSH_S instead of one per token
+                transcript_parts.append(event["delta"])
+                if time.monotonic() - transcript_flushed_at >= TRANSCRIPT_FLUSH_S:
+                    flush_transcript()
+            
+            async def on_transcript_done(event) -> None:
+                nonlocal current_user_message
+                flush_transcript()
+                # Log AI response to LangSmith
+                ai_transcript = event.get('transcript', '')
+                if ai_transcript:
+                    # One wall-clock read for the whole turn boundary
+                    now = time.time()
+                    log_in_background(log_ai_response, ai_transcript, now)
+                    # Create background task after AI response is complete
+                    # Always trigger background agent after AI responds
+                    if current_user_message:
+                        await background_manager.on_conversation_turn_complete(
+                            current_user_message, ai_transcript, now
+                        )
+                        current_user_message = None
+                print()
+            
+            async def on_user_transcript(event) -> None:
+                nonlocal current_user_message
+                # Print completed user transcript and log to LangSmith
+                user_message = event["transcript"]
+                print(f"[User] {user_message}")
+                log_in_background(log_user_message, user_message, time.time())
+                current_user_message = user_message
+            
+            async def on_speech_started(event) -> None:
+                nonlocal response_active
+                print("\n[User speaking...]")
+                # Barge-in: cancel the active response (prevents overlap); server
+                # VAD reports this once per interruption
+                if response_active:
+                    response_active = False
+                    try:
+                        await conn.send_raw(CANCEL_EVENT)
+                    except Exception as e:
+                        print(f"[cancel error] {e}")
+                    # Stop the rest of the reply already in the playback ring
+                    audio.flush_playback()
+                background_manager.set_user_speaking(True)
+            
+            async def on_speech_stopped(event) -> None:
+                print("[User finished speaking]")
+                background_manager.set_user_speaking(False)
+            
+            async def on_response_done(event) -> None:
+                nonlocal response_active
+                response_active = False
+                background_manager.response_in_progress = False
+            
+            async def on_response_started(event) -> None:
+                nonlocal response_active
+                response_active = True
+                background_manager.response_in_progress = True
+            
+            async def on_response_error(event) -> None:
+                nonlocal response_active
+                print(f"[model error] {event.get('error', event)}")
+                response_active = False
+                background_manager.response_in_progress = False
+            
+            async def on_error(event) -> None:
+                nonlocal response_active
+                # Improved error handling based on OpenAI documentation
+                error = event.get('error') or {}
+                print(f"[conn error] Type: {error.get('type', 'unknown')}")
+                print(f"[conn error] Code: {error.get('code', 'unknown')}")
+                print(f"[conn error] Event ID: {error.get('event_id', 'unknown')}")
+                print(f"[conn error] Message: {error.get('message', str(error))}")
+                response_active = False
+            
+            # Event type -> handler, one dict lookup per event (audio deltas
+            # arrive every ~20 ms); unlisted types, such as the user
+            # transcription deltas, are ignored
+            handlers = {
+                "response.output_audio.delta": on_audio_delta,
+                "response.output_audio_transcript.delta": on_transcript_delta,
+                "response.output_audio_transcript.done": on_transcript_done,
+                "conversation.item.input_audio_transcription.completed": on_user_transcript,
+                "input_audio_buffer.speech_started": on_speech_started,
+                "input_audio_buffer.speech_stopped": on_speech_stopped,
+                "response.done": on_response_done,
+                "response.started": on_response_started,
+                "response.error": on_response_error,
+                "error": on_error,
+            }
             
             async def pump_model() -> None:
-                nonlocal response_active, current_user_message
-                async for event in conn:
-                    t = event.type
-                    if t == "response.output_audio.delta":
-                        # Base64 -> bytes -> speaker
-                        pcm_bytes = base64.b64decode(event.delta)
-                        speaker.play_bytes(pcm_bytes)
-                    elif t == "response.output_audio_transcript.delta":
-                        # Print live transcript of audio output
-                        print(event.delta, end="", flush=True)
-                    elif t == "response.output_audio_transcript.done":
-                        # Log AI response to LangSmith
-                        ai_transcript = getattr(event, 'transcript', '')
-                        if ai_transcript:
-                            log_ai_response(ai_transcript, time.time())
-                            # Create background task after AI response is complete
-                            # Always trigger background agent after AI responds
-                            if current_user_message:
-                                await background_manager.on_conversation_turn_complete(
-                                    current_user_message, ai_transcript
-                                )
-                                current_user_message = None
-                        print()
-                    elif t == "conversation.item.input_audio_transcription.delta":
-                        # Print live transcript of user input
-                        # print(f"[User] {event.delta}", end="", flush=True)
-                        continue
-                    elif t == "conversation.item.input_audio_transcription.completed":
-                        # Print completed user transcript and log to LangSmith
-                        user_message = event.transcript
-                        print(f"[User] {user_message}")
-                        log_user_message(user_message, time.time())
-                        current_user_message = user_message
-                    elif t == "input_audio_buffer.speech_started":
-                        print("\n[User speaking...]")
-                        background_manager.set_user_speaking(True)
-                    elif t == "input_audio_buffer.speech_stopped":
-                        print("[User finished speaking]")
-                        background_manager.set_user_speaking(False)
-                    elif t == "response.done":
-                        response_active = False
-                        background_manager.response_in_progress = False
-                    elif t == "response.started":
-                        response_active = True
-                        background_manager.response_in_progress = True
-                    elif t == "response.error":
-                        print(f"[model error] {getattr(event, 'error', event)}")
-                        response_active = False
-                        background_manager.response_in_progress = False
-                    elif t == "error":
-                        # Improved error handling based on OpenAI documentation
-                        error = getattr(event, 'error', event)
-                        print(f"[conn error] Type: {getattr(error, 'type', 'unknown')}")
-                        print(f"[conn error] Code: {getattr(error, 'code', 'unknown')}")
-                        print(f"[conn error] Event ID: {getattr(error, 'event_id', 'unknown')}")
-                        print(f"[conn error] Message: {getattr(error, 'message', str(error))}")
-                        response_active = False
+                async for event in server_events(conn):
+                    handler = handlers.get(event.get("type"))
+                    if handler is not None:
+                        await handler(event)
 
             # 5) Run both main tasks until Ctrl+C
             await asyncio.gather(pump_mic(), pump_model())
@@ -444,15 +732,20 @@ async def main() -> None:
     except KeyboardInterrupt:
         pass
     finally:
-        mic.close()
-        speaker.close()
+        audio.pause()
         # Clean up background tasks
         background_manager.cleanup_completed_tasks()
         cleanup_old_tasks()
         # Ensure all LangSmith traces are submitted before exiting
-        langsmith_client.flush()
+        if _pending_logs:
+            await asyncio.gather(*_pending_logs, return_exceptions=True)
+        if langsmith_client is not None:
+            langsmith_client.flush()
 
 if __name__ == "__main__":
     # On macOS, you may need: brew install portaudio ffmpeg
     # Also grant mic permission to your terminal.
-    asyncio.run(main())
\ No newline at end of file
+    try:
+        asyncio.run(main())
+    finally:
+        close_audio_device()
\ No newline at end of file
@@ -6,7 +6,7 @@ This simulates the out-of-band response structure without needing the full audio
 
 import json
 import asyncio
-from simple_background_agent import create_background_task, get_task_status
+from simple_background_agent import create_background_task, get_task_status, get_task_event, release_task_event
 
 def test_out_of_band_response_structure():
     """Test that the out-of-band response structure is correct"""
@@ -81,64 +81,70 @@ async def test_background_task_integration():
     
     print(f"Created task: {task_id}")
     
-    # Monitor the task
-    while True:
-        status = get_task_status(task_id)
-        
-        if status['status'] == 'completed':
-            print(f"✅ Task completed: {status['result']}")
+    # Monitor the task: the status is checked first, then we sleep until
+    # the agent reports the next change (no fixed polling interval)
+    changed = get_task_event(task_id)
+    try:
+        while True:
+            changed.clear()
+            status = get_task_status(task_id)
             
-            # Test the out-of-band response structure with real data
-            result = status['result']
-            test_response = {
-                "type": "response.create",
-                "response": {
-                    "conversation": "none",
-                    "metadata": {
-                        "source": "background_agent",
-                        "task_id": task_id,
-                        "action": result.get('action', 'unknown')
-                    },
-                    "output_modalities": ["text", "audio"],
-                    "instructions": f"Background task completed: {result.get('action')}",
-                    "input": [
-                        {
-                            "type": "message",
-                            "role": "user", 
-                            "content": [{
-                                "type": "input_text",
-                                "text": "Send an email to John about the meeting"
-                            }]
+            if status['status'] == 'completed':
+                print(f"✅ Task completed: {status['result']}")
+                
+                # Test the out-of-band response structure with real data
+                result = status['result']
+                test_response = {
+                    "type": "response.create",
+                    "response": {
+                        "conversation": "none",
+                        "metadata": {
+                            "source": "background_agent",
+                            "task_id": task_id,
+                            "action": result.get('action', 'unknown')
                         },
-                        {
-                            "type": "message",
-                            "role": "assistant",
-                            "content": [{
-                                "type": "output_text",  # Fixed: was input_text
-                                "text": "I'll help you send that email to John about the meeting"
-                            }]
-                        },
-                        {
-                            "type": "message",
-                            "role": "system",
-                            "content": [{
-                                "type": "input_text",
-                                "text": f"Background task completed: {json.dumps(result)}"
-                            }]
-                        }
-                    ]
+                        "output_modalities": ["text", "audio"],
+                        "instructions": f"Background task completed: {result.get('action')}",
+                        "input": [
+                            {
+                                "type": "message",
+                                "role": "user", 
+                                "content": [{
+                                    "type": "input_text",
+                                    "text": "Send an email to John about the meeting"
+                                }]
+                            },
+                            {
+                                "type": "message",
+                                "role": "assistant",
+                                "content": [{
+                                    "type": "output_text",  # Fixed: was input_text
+                                    "text": "I'll help you send that email to John about the meeting"
+                                }]
+                            },
+                            {
+                                "type": "message",
+                                "role": "system",
+                                "content": [{
+                                    "type": "input_text",
+                                    "text": f"Background task completed: {json.dumps(result)}"
+                                }]
+                            }
+                        ]
+                    }
                 }
-            }
-            
-            print("✅ Out-of-band response structure is correct")
-            print(f"✅ Assistant message type: {test_response['response']['input'][1]['content'][0]['type']}")
-            break
+                
+                print("✅ Out-of-band response structure is correct")
+                print(f"✅ Assistant message type: {test_response['response']['input'][1]['content'][0]['type']}")
+                break
+                
+            elif status['status'] in ('error', 'not_found'):
+                print(f"❌ Task failed: {status['error']}")
+                break
             
-        elif status['status'] == 'error':
-            print(f"❌ Task failed: {status['error']}")
-            break
-        
-        await asyncio.sleep(0.5)
+            await changed.wait()
+    finally:
+        release_task_event(task_id)
 
 if __name__ == "__main__":
     print("🔧 Testing Out-of-Band Response Fix")
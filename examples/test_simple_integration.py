@@ -6,7 +6,13 @@ without needing the full audio setup.
 
 import asyncio
 import time
-from simple_background_agent import create_background_task, get_task_status, cleanup_old_tasks
+from simple_background_agent import (
+    create_background_task,
+    get_task_status,
+    get_task_event,
+    release_task_event,
+    cleanup_old_tasks
+)
 
 async def test_background_agent():
     """Test the background agent with simulated conversation turns"""
@@ -49,43 +55,52 @@ async def test_background_agent():
         task_ids.append(task_id)
         print(f"   ✅ Created background task: {task_id}")
     
-    print(f"\n⏳ Polling {len(task_ids)} background tasks...")
+    print(f"\n⏳ Waiting on {len(task_ids)} background tasks...")
     print("=" * 50)
     
-    # Poll for completion
-    completed_tasks = set()
+    # Wait on each task concurrently: the status is checked, then we sleep
+    # until the agent reports the next change (no polling interval)
     start_time = time.time()
     
-    while len(completed_tasks) < len(task_ids):
-        for task_id in task_ids:
-            if task_id in completed_tasks:
-                continue
+    async def poll_one(task_id):
+        reported_running = False
+        changed = get_task_event(task_id)
+        try:
+            while True:
+                changed.clear()
+                status = get_task_status(task_id)
+                elapsed = time.time() - start_time
                 
-            status = get_task_status(task_id)
-            elapsed = time.time() - start_time
-            
-            if status['status'] == 'completed':
-                print(f"✅ Task {task_id} completed after {elapsed:.1f}s")
-                print(f"   Result: {status['result']}")
-                completed_tasks.add(task_id)
+                if status['status'] == 'completed':
+                    print(f"✅ Task {task_id} completed after {elapsed:.1f}s")
+                    print(f"   Result: {status['result']}")
+                    return status
                 
-            elif status['status'] == 'error':
-                print(f"❌ Task {task_id} failed: {status['error']}")
-                completed_tasks.add(task_id)
+                elif status['status'] == 'error':
+                    print(f"❌ Task {task_id} failed: {status['error']}")
+                    return status
                 
-            elif status['status'] == 'running':
-                print(f"🔄 Task {task_id} is running... ({elapsed:.1f}s)")
-        
-        if len(completed_tasks) < len(task_ids):
-            await asyncio.sleep(1)
+                elif status['status'] == 'not_found':
+                    # Evicted or never created: no further change will come
+                    print(f"❓ Task {task_id} not found")
+                    return status
+                
+                elif status['status'] == 'running' and not reported_running:
+                    print(f"🔄 Task {task_id} is running... ({elapsed:.1f}s)")
+                    reported_running = True
+                
+                await changed.wait()
+        finally:
+            release_task_event(task_id)
+    
+    results = await asyncio.gather(*(poll_one(task_id) for task_id in task_ids))
     
     print("\n🎉 All background tasks completed!")
     print("=" * 50)
     
     # Show final results
     print("\n📊 Final Results:")
-    for task_id in task_ids:
-        status = get_task_status(task_id)
+    for task_id, status in zip(task_ids, results):
         if status['status'] == 'completed':
             result = status['result']
             action = result.get('action', 'unknown')
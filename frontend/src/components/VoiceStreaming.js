@@ -3,6 +3,21 @@ import { motion, AnimatePresence } from 'framer-motion';
 import { Mic, MicOff, Volume2, VolumeX, Loader2 } from 'lucide-react';
 import './VoiceStreaming.css';
 
+// The API sends JSON as binary frames (UTF-8 bytes); decode them before parsing
+const textDecoder = new TextDecoder();
+
+// Binary audio frame header, mirrors AUDIO_FRAME_HEADER ("<BId") in api/main.py
+const MSG_AUDIO = 1;
+const AUDIO_FRAME_HEADER_SIZE = 13;
+
+const audioFrameHeader = (length) => {
+  const header = new DataView(new ArrayBuffer(AUDIO_FRAME_HEADER_SIZE));
+  header.setUint8(0, MSG_AUDIO);
+  header.setUint32(1, length, true);
+  header.setFloat64(5, Date.now() / 1000, true);
+  return header.buffer;
+};
+
 const VoiceStreaming = ({ onTranscript, onError, isConnected }) => {
   const [isListening, setIsListening] = useState(false);
   const [isPlaying, setIsPlaying] = useState(false);
@@ -31,6 +46,7 @@ const VoiceStreaming = ({ onTranscript, onError, isConnected }) => {
   const connectWebSocket = () => {
     setConnectionStatus('connecting');
     const ws = new WebSocket('ws://localhost:8000/ws/voice');
+    ws.binaryType = 'arraybuffer';
     wsRef.current = ws;
 
     ws.onopen = () => {
@@ -40,7 +56,8 @@ const VoiceStreaming = ({ onTranscript, onError, isConnected }) => {
 
     ws.onmessage = (event) => {
       try {
-        const data = JSON.parse(event.data);
+        const text = typeof event.data === 'string' ? event.data : textDecoder.decode(event.data);
+        const data = JSON.parse(text);
         handleWebSocketMessage(data);
       } catch (error) {
         console.error('[VoiceStreaming] Error parsing WebSocket message:', error);
@@ -191,17 +208,9 @@ const VoiceStreaming = ({ onTranscript, onError, isConnected }) => {
 
       mediaRecorder.ondataavailable = (event) => {
         if (event.data.size > 0 && wsRef.current && wsRef.current.readyState === WebSocket.OPEN) {
-          // Convert to base64 and send
-          const reader = new FileReader();
-          reader.onload = () => {
-            const base64 = reader.result.split(',')[1];
-            wsRef.current.send(JSON.stringify({
-              type: 'audio_data',
-              audio: base64,
-              timestamp: Date.now()
-            }));
-          };
-          reader.readAsDataURL(event.data);
+          // Send as a binary frame: 13-byte header (type, length, send time)
+          // followed by the raw audio, no base64 or JSON envelope
+          wsRef.current.send(new Blob([audioFrameHeader(event.data.size), event.data]));
         }
       };
 
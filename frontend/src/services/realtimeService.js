@@ -2,6 +2,9 @@
  * Realtime WebSocket service for speech-to-speech conversation
  */
 
+// The API sends JSON as binary frames (UTF-8 bytes); decode them before parsing
+const textDecoder = new TextDecoder();
+
 class RealtimeService {
   constructor() {
     this.ws = null;
@@ -32,6 +35,7 @@ class RealtimeService {
     
     try {
       this.ws = new WebSocket(wsUrl);
+      this.ws.binaryType = 'arraybuffer';
       
       this.ws.onopen = () => {
         console.log('[RealtimeService] Connected to realtime API');
@@ -42,7 +46,8 @@ class RealtimeService {
 
       this.ws.onmessage = (event) => {
         try {
-          const data = JSON.parse(event.data);
+          const text = typeof event.data === 'string' ? event.data : textDecoder.decode(event.data);
+          const data = JSON.parse(text);
           this.emit('message', data);
         } catch (error) {
           console.error('[RealtimeService] Error parsing message:', error);
@@ -2,6 +2,9 @@
  * WebSocket service for connecting to the Agent in the Loop API
  */
 
+// The API sends JSON as binary frames (UTF-8 bytes); decode them before parsing
+const textDecoder = new TextDecoder();
+
 class WebSocketService {
   constructor() {
     this.ws = null;
@@ -28,6 +31,7 @@ class WebSocketService {
     
     try {
       this.ws = new WebSocket(wsUrl);
+      this.ws.binaryType = 'arraybuffer';
       
       this.ws.onopen = () => {
         console.log('[WebSocket] Connected to API');
@@ -38,7 +42,8 @@ class WebSocketService {
 
       this.ws.onmessage = (event) => {
         try {
-          const data = JSON.parse(event.data);
+          const text = typeof event.data === 'string' ? event.data : textDecoder.decode(event.data);
+          const data = JSON.parse(text);
           this.emit('message', data);
         } catch (error) {
           console.error('[WebSocket] Error parsing message:', error);